@@ -0,0 +1,87 @@
+import os
+import time
+import zipfile
+from logging import warning
+
+# Geração de arquivos ZIP em streaming.
+#
+# O ZipFile escreve em um buffer que não suporta seek; a cada trecho escrito o
+# gerador entrega os bytes acumulados para a resposta HTTP e esvazia o buffer.
+# Assim o arquivo nunca fica inteiro em memória, por maior que seja.
+
+CHUNK_SIZE = 64 * 1024
+
+# Formatos que já são comprimidos internamente (PDF com streams deflate,
+# DOCX/ODT são ZIPs): entram no arquivo sem compressão
+COMPRESSED_EXTENSIONS = {"pdf", "docx", "odt", "zip", "png", "jpg", "jpeg", "gif"}
+
+
+def should_compress(filename):
+    """Se vale a pena aplicar deflate a um arquivo, pela extensão."""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return extension not in COMPRESSED_EXTENSIONS
+
+
+class _StreamBuffer:
+    """Destino de escrita do ZipFile que só acumula bytes até o próximo drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries, chunk_size=CHUNK_SIZE):
+    """
+    Gera um ZIP em pedaços a partir de entries, um iterável de
+    (nome no arquivo, caminho do arquivo em disco, comprimir?).
+
+    Arquivos já comprimidos (PDF, DOCX, imagens...) devem ser armazenados sem
+    compressão (comprimir=False): o deflate não reduz o tamanho e só gasta CPU.
+
+    Cada arquivo é aberto antes de qualquer byte da sua entrada ser gerado:
+    um arquivo removido antes disso (ex.: cache invalidado durante o
+    download) é omitido, em vez de interromper no meio um ZIP cujos headers
+    HTTP já foram enviados. Depois de aberto, continua legível mesmo se for
+    removido.
+    """
+    buffer = _StreamBuffer()
+    block = bytearray(chunk_size)
+    view = memoryview(block)
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, path, compress in entries:
+            try:
+                # Leitura sem buffer intermediário, em blocos grandes, para um
+                # bytearray reaproveitado entre as leituras
+                source = open(path, "rb", buffering=0)
+            except FileNotFoundError:
+                warning(f"Arquivo removido antes de entrar no ZIP, omitido: {name}")
+                continue
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            # O tamanho informado decide se a entrada precisa de ZIP64
+            info.file_size = os.fstat(source.fileno()).st_size
+            with source, archive.open(info, "w") as dest:
+                while True:
+                    read = source.readinto(block)
+                    if not read:
+                        break
+                    dest.write(view[:read])
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    # Diretório central, escrito ao fechar o ZipFile
+    yield buffer.drain()
@@ -0,0 +1,531 @@
+import base64
+import json
+import os
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from logging import warning
+from threading import Lock, local
+
+from app import app
+
+# Camada de cache da aplicação.
+#
+# Cada cache (Cache) é um namespace com TTL padrão sobre um backend
+# compartilhado, escolhido por CACHE_BACKEND:
+#
+# - "memory": LRU em memória, por processo, limitado a CACHE_MAX_ENTRIES
+#   entradas (o padrão; um único processo ou desenvolvimento).
+# - "shared": arquivo SQLite (por padrão em instance/cache, pasta 0700 e
+#   arquivo 0600), visto por todos os workers do gunicorn na mesma máquina.
+#   Uma invalidação feita em um worker vale para os demais.
+# - "redis": servidor Redis (ou compatível: Valkey, KeyDB...) em
+#   CACHE_REDIS_URL; requer o pacote opcional redis.
+#
+# A invalidação é feita por tags versionadas: cada entrada guarda a versão
+# das suas tags no momento da escrita, e invalidate_tags() apenas troca a
+# versão, sem procurar as chaves. Cache.clear() é a invalidação da tag do
+# namespace. Views inteiras entram no cache pelo decorator cached().
+#
+# Nos backends shared e redis os valores são gravados como JSON, nunca com
+# pickle: quem consegue escrever no arquivo ou no servidor não deve conseguir
+# executar código na aplicação. Além dos tipos do JSON, bytes e RawJSON
+# voltam com o tipo original; tuplas voltam como listas.
+#
+# Acertos e faltas são contados por namespace e as remoções por falta de
+# espaço pelo backend (cache_stats, em GET /api/metrics/cache). As métricas
+# são do processo que atende o request.
+
+_MISSING = object()
+_RAW_JSON = "__raw_json__"
+_BYTES = "__bytes__"
+
+
+class RawJSON(str):
+    """Texto que já é JSON válido e deve ser embutido sem nova serialização."""
+
+
+def _encode(value):
+    if isinstance(value, RawJSON):
+        return {_RAW_JSON: str(value)}
+    if isinstance(value, bytes):
+        return {_BYTES: base64.b64encode(value).decode("ascii")}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    return value
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        if _RAW_JSON in obj:
+            return RawJSON(obj[_RAW_JSON])
+        if _BYTES in obj:
+            return base64.b64decode(obj[_BYTES])
+    return obj
+
+
+def _dumps(value):
+    """Serializa um valor do cache em JSON."""
+    return json.dumps(_encode(value), separators=(",", ":"))
+
+
+def _loads(data):
+    """Valor gravado por _dumps(); _MISSING se não for JSON (ex.: pickle antigo)."""
+    try:
+        return json.loads(data, object_hook=_decode)
+    except ValueError:
+        return _MISSING
+
+
+def _private_file(path):
+    """
+    Cria o arquivo do cache com permissão 0600 (e a pasta com 0700) e recusa
+    arquivos, inclusive o WAL do SQLite, que não sejam do usuário do processo.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    try:
+        info = os.fstat(fd)
+        if info.st_uid != os.getuid():
+            raise RuntimeError(
+                f"CACHE_SHARED_PATH {path} pertence a outro usuário (uid {info.st_uid})."
+            )
+        if info.st_mode & 0o077:
+            os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+    for suffix in ("-wal", "-shm"):
+        try:
+            info = os.lstat(path + suffix)
+        except FileNotFoundError:
+            continue
+        if info.st_uid != os.getuid():
+            raise RuntimeError(
+                f"{path + suffix} pertence a outro usuário (uid {info.st_uid})."
+            )
+
+
+class MemoryBackend:
+    """
+    LRU em memória com expiração por tempo, seguro entre threads.
+    Entradas sem TTL (versões das tags) ficam fora do LRU e nunca são
+    removidas por falta de espaço.
+    """
+
+    name = "memory"
+    errors = ()
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._pinned = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return self._pinned.get(key, _MISSING)
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            if ttl is None:
+                self._pinned[key] = value
+                return
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._pinned.pop(key, None)
+
+    def stats(self):
+        return {"entries": len(self._data), "evictions": self.evictions}
+
+
+class SharedBackend:
+    """
+    Cache compartilhado entre processos em um arquivo SQLite, acessível só
+    ao usuário do processo. Os valores são serializados em JSON (_dumps).
+    Quando há mais de max_entries entradas, remove as mais próximas de
+    expirar (aproximação do LRU que não exige uma escrita a cada leitura).
+    """
+
+    name = "shared"
+    errors = (sqlite3.Error,)
+
+    # Verifica o limite de entradas a cada N escritas
+    EVICTION_INTERVAL = 100
+
+    def __init__(self, path, max_entries=10000):
+        _private_file(path)
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._writes = 0
+        self._local = local()
+
+    def _connection(self):
+        # Uma conexão por thread e por processo (os workers do gunicorn são
+        # criados por fork)
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        rows = self._connection().execute(
+            f"SELECT key, value FROM cache WHERE key IN ({','.join('?' * len(keys))})"
+            " AND (expires_at IS NULL OR expires_at >= ?)",
+            [*keys, time.time()],
+        )
+        found = {key: _loads(value) for key, value in rows}
+        return [found.get(key, _MISSING) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (
+                key,
+                _dumps(value),
+                None if ttl is None else time.time() + ttl,
+            ),
+        )
+        self._writes += 1
+        if self._writes % self.EVICTION_INTERVAL == 0:
+            self._evict(connection)
+
+    def _evict(self, connection):
+        connection.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        (count,) = connection.execute(
+            "SELECT count(*) FROM cache WHERE expires_at IS NOT NULL"
+        ).fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache"
+                " WHERE expires_at IS NOT NULL ORDER BY expires_at LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += excess
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def stats(self):
+        (count,) = self._connection().execute("SELECT count(*) FROM cache").fetchone()
+        return {"entries": count, "evictions": self.evictions}
+
+
+class RedisBackend:
+    """
+    Cache em um servidor Redis (ou compatível). A expiração e a remoção por
+    falta de memória (maxmemory-policy) ficam a cargo do servidor.
+    """
+
+    name = "redis"
+
+    def __init__(self, url, prefix="eventum:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "CACHE_BACKEND=redis requer o pacote opcional redis."
+            ) from e
+        self.errors = (redis.RedisError,)
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        values = self._client.mget([self.prefix + key for key in keys])
+        return [_MISSING if value is None else _loads(value) for value in values]
+
+    def set(self, key, value, ttl=None):
+        self._client.set(
+            self.prefix + key,
+            _dumps(value),
+            px=None if ttl is None else max(1, int(ttl * 1000)),
+        )
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def stats(self):
+        info = self._client.info("stats")
+        return {"entries": self._client.dbsize(), "evictions": info.get("evicted_keys")}
+
+
+_backend = None
+_backend_lock = Lock()
+_caches = {}
+
+
+def create_backend(config):
+    """Cria o backend descrito por CACHE_BACKEND na configuração da aplicação."""
+    kind = config.get("CACHE_BACKEND", "memory")
+    max_entries = config.get("CACHE_MAX_ENTRIES", 10000)
+    if kind == "memory":
+        return MemoryBackend(max_entries)
+    if kind == "shared":
+        path = config.get("CACHE_SHARED_PATH") or os.path.join(
+            app.instance_path, "cache", "eventum-cache.sqlite3"
+        )
+        return SharedBackend(path, max_entries)
+    if kind == "redis":
+        return RedisBackend(config["CACHE_REDIS_URL"])
+    raise ValueError(f"CACHE_BACKEND desconhecido: {kind}")
+
+
+def get_backend():
+    """Backend em uso, criado no primeiro acesso a partir da configuração."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(app.config)
+    return _backend
+
+
+def set_backend(backend):
+    """Troca o backend do processo (benchmarks e scripts)."""
+    global _backend
+    _backend = backend
+
+
+def _tag_key(tag):
+    return f"tag:{tag}"
+
+
+def _tag_versions(backend, tags):
+    """Versões atuais das tags. Tags sem versão recebem uma nova."""
+    versions = backend.get_many([_tag_key(tag) for tag in tags])
+    for i, version in enumerate(versions):
+        if version is _MISSING:
+            # Uma versão nova invalida qualquer entrada gravada antes de a
+            # versão anterior ser perdida (ex.: reinício do Redis)
+            versions[i] = uuid.uuid4().hex
+            backend.set(_tag_key(tags[i]), versions[i])
+    return versions
+
+
+def tag_versions(*tags):
+    """
+    Versões atuais das tags, para estruturas em memória que se invalidam
+    pelas mesmas tags (ex.: o índice de busca em app/search.py). Retorna None
+    se o backend estiver indisponível.
+    """
+    backend = get_backend()
+    try:
+        return _tag_versions(backend, list(tags))
+    except backend.errors as e:
+        warning(f"Erro ao ler as versões das tags {tags} do cache: {e}")
+        return None
+
+
+def invalidate_tags(*tags):
+    """Invalida todas as entradas, em qualquer cache, marcadas com as tags."""
+    backend = get_backend()
+    try:
+        for tag in tags:
+            backend.set(_tag_key(tag), uuid.uuid4().hex)
+    except backend.errors as e:
+        warning(f"Erro ao invalidar as tags {tags} do cache: {e}")
+
+
+class Cache:
+    """
+    Namespace de cache com TTL padrão. Erros do backend (Redis fora do ar,
+    por exemplo) são registrados e tratados como falta no cache.
+    """
+
+    def __init__(self, namespace, ttl=60):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._tag = f"ns:{namespace}"
+        _caches[namespace] = self
+
+    def _key(self, key):
+        return f"{self.namespace}:{key!r}"
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, default=None):
+        backend = get_backend()
+        try:
+            entry = backend.get(self._key(key))
+            if entry is not _MISSING:
+                tags, versions, value = entry
+                if _tag_versions(backend, tags) == versions:
+                    self._count(True)
+                    return value
+        except backend.errors as e:
+            warning(f"Erro ao ler o cache {self.namespace}: {e}")
+        self._count(False)
+        return default
+
+    def set(self, key, value, ttl=None, tags=()):
+        backend = get_backend()
+        tags = [self._tag, *tags]
+        try:
+            entry = (tags, _tag_versions(backend, tags), value)
+            backend.set(self._key(key), entry, self.ttl if ttl is None else ttl)
+        except backend.errors as e:
+            warning(f"Erro ao gravar no cache {self.namespace}: {e}")
+
+    def get_or_set(self, key, factory, ttl=None, tags=()):
+        """Retorna o valor em cache ou calcula com factory() e armazena."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, ttl, tags)
+        return value
+
+    def delete(self, key):
+        backend = get_backend()
+        try:
+            backend.delete(self._key(key))
+        except backend.errors as e:
+            warning(f"Erro ao remover do cache {self.namespace}: {e}")
+
+    def clear(self):
+        invalidate_tags(self._tag)
+
+
+def cached(namespace, key=None, tags=(), ttl=60):
+    """
+    Cacheia a resposta de uma view (só respostas 200 e não streamed).
+
+    key: função que recebe os argumentos da view e retorna a chave (pode ler
+    request.args ou g.user); sem ela, a chave são os próprios argumentos.
+    tags: tags de invalidação (ver invalidate_tags), ou uma função que recebe
+    os argumentos da view e as retorna.
+    """
+    cache = Cache(namespace, ttl)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            cache_key = key(**kwargs) if key else tuple(sorted(kwargs.items()))
+            entry = cache.get(cache_key)
+            if entry is not None:
+                body, headers = entry
+                response = app.response_class(body, headers=headers)
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            response = app.make_response(view(**kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                headers = [
+                    (name, value)
+                    for name, value in response.headers.items()
+                    if name not in ("Content-Length", "Set-Cookie")
+                ]
+                cache.set(
+                    cache_key,
+                    (response.get_data(), headers),
+                    tags=tags(**kwargs) if callable(tags) else tags,
+                )
+            response.headers["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def clear_all():
+    """Invalida todos os caches registrados (benchmarks e scripts)."""
+    for cache in list(_caches.values()):
+        cache.clear()
+
+
+def cache_stats():
+    """Métricas do cache neste processo: backend, acertos, faltas e remoções."""
+    backend = get_backend()
+    try:
+        stats = backend.stats()
+    except backend.errors as e:
+        stats = {"error": str(e)}
+    namespaces = {}
+    for namespace, cache in sorted(_caches.items()):
+        total = cache.hits + cache.misses
+        namespaces[namespace] = {
+            "hits": cache.hits,
+            "misses": cache.misses,
+            "hit_ratio": round(cache.hits / total, 3) if total else None,
+        }
+    return {"backend": backend.name, **stats, "namespaces": namespaces}
+
+
+# Contagem total de eventos publicados por combinação de filtros (/api/events)
+event_count_cache = Cache("event_count", ttl=60)
+
+# Dados de sessão dos usuários autenticados (ver views.load_user).
+# Invalidado explicitamente sempre que os dados do usuário mudam.
+user_cache = Cache("user", ttl=300)
+
+# Códigos de check-in abertos -> dados da atividade/evento (ver app/checkin.py).
+# O INSERT do check-in revalida o código no banco, então o TTL só limita
+# quanto tempo um código fechado ocupa memória.
+checkin_code_cache = Cache("checkin_code", ttl=30)
+
+# Dados do dashboard (/api/) por usuário (ver serializers.dashboard_snapshot).
+# Invalidado na inscrição, cancelamento, submissão e avaliação; alterações em
+# eventos limpam o cache inteiro.
+dashboard_cache = Cache("dashboard", ttl=60)
+
+# Fragmentos de JSON já serializados de listas globais: próximos eventos e
+# primeira página de /api/events (ver serializers.json_fragment).
+# TTL curto e invalidação explícita nas escritas.
+fragment_cache = Cache("fragment", ttl=30)
+
+# Andamento da pré-geração de certificados por evento (ver
+# certificates.pregenerate_event). Com CACHE_BACKEND shared ou redis, qualquer
+# worker responde o status de um job iniciado em outro.
+certificate_job_cache = Cache("certificate_job", ttl=24 * 3600)
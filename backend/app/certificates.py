@@ -0,0 +1,386 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from logging import warning
+from threading import Lock, Thread
+
+from markupsafe import escape
+from sqlalchemy import select
+from werkzeug.utils import secure_filename
+
+from app import app, db
+from app.archive import stream_zip
+from app.cache import certificate_job_cache
+from app.models import Event, User, inscriptions
+
+# Cache em disco dos certificados em PDF.
+#
+# Renderizar um PDF com o WeasyPrint custa centenas de milissegundos de CPU, e
+# todos os participantes baixam o certificado logo depois que o evento acaba.
+# Cada PDF é gravado em CERTIFICATES_CACHE_DIR/<event_id>/<user_id>-<hash>.pdf,
+# onde <hash> é o SHA-256 do HTML e do CSS do certificado: se o nome do
+# participante ou o título, datas, carga horária ou organizador do evento
+# mudarem, o hash muda e o arquivo antigo nunca é servido. O request só
+# renderiza em caso de miss; o organizador pode pré-gerar os certificados de
+# todos os inscritos (pregenerate_event) ou baixá-los em um ZIP
+# (stream_event_zip), ambos renderizados em um pool de processos.
+#
+# O pool é criado uma vez por processo, no primeiro uso, com forkserver (ou
+# spawn): um fork do worker do servidor copiaria as threads, locks e
+# conexões abertas nele. Exportações simultâneas dividem os mesmos
+# CERTIFICATE_WORKERS processos.
+#
+# O estado de cada pré-geração fica em certificate_job_cache, para que o
+# status seja visto por todos os workers (com CACHE_BACKEND=memory, só pelo
+# worker que iniciou o job).
+
+CERTIFICATE_CSS = """
+    body { font-family: sans-serif; text-align: center; padding: 40px; }
+    .container { border: 10px solid #003366; padding: 50px; height: 90%; box-sizing: border-box; }
+    h1 { color: #003366; font-size: 48px; margin-bottom: 20px; }
+    h2 { font-size: 32px; margin-bottom: 50px; }
+    p { font-size: 18px; line-height: 1.6; margin: 20px 0; }
+    .signature { margin-top: 80px; }
+"""
+
+CERTIFICATE_TEMPLATE = """
+    <html>
+    <head>
+        <meta charset="UTF-8">
+    </head>
+    <body>
+        <div class="container">
+            <h1>CERTIFICADO</h1>
+            <p>Certificamos que</p>
+            <h2>{user_name}</h2>
+            <p>
+                participou do evento
+                <strong>"{event_title}"</strong>,
+                organizado por {organizer_name},
+                realizado entre {start_date} e {end_date},
+                totalizando uma carga horária de <strong>{workload} horas</strong>.
+            </p>
+            <div class="signature">
+                <p>___________________________________</p>
+                <p>{organizer_name}</p>
+                <p>Organizador(a)</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+# Folha de estilo e configuração de fontes já processadas, uma por processo
+_renderer = None
+
+_pool = None
+_pool_lock = Lock()
+
+# Jobs em andamento neste processo (o cache guarda a cópia vista pelos demais)
+_jobs = {}
+_jobs_lock = Lock()
+# Um job "running" sem atualização há mais que isto é de um processo que
+# morreu e pode ser reiniciado
+JOB_STALE_SECONDS = 600
+
+
+def render_html(event, organizer_name, user_name):
+    """Monta o HTML do certificado de um participante."""
+    return CERTIFICATE_TEMPLATE.format(
+        user_name=escape(user_name),
+        event_title=escape(event.title),
+        organizer_name=escape(organizer_name),
+        start_date=event.start_date.strftime("%d/%m/%Y"),
+        end_date=event.end_date.strftime("%d/%m/%Y"),
+        workload=event.workload or 0,
+    )
+
+
+def _event_dir(event_id):
+    return os.path.join(app.config["CERTIFICATES_CACHE_DIR"], str(event_id))
+
+
+def cache_path(event_id, user_id, html):
+    """Caminho do PDF em cache para este conteúdo de certificado."""
+    digest = hashlib.sha256((CERTIFICATE_CSS + html).encode("utf-8")).hexdigest()[:32]
+    return os.path.join(_event_dir(event_id), f"{user_id}-{digest}.pdf")
+
+
+def init_renderer():
+    """
+    Processa o CSS e a configuração de fontes do WeasyPrint uma única vez por
+    processo (usado como initializer dos workers do pool).
+    """
+    global _renderer
+    if _renderer is None:
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        font_config = FontConfiguration()
+        stylesheet = CSS(string=CERTIFICATE_CSS, font_config=font_config)
+        _renderer = (stylesheet, font_config)
+    return _renderer
+
+
+def render_to_file(html, path):
+    """
+    Renderiza o HTML em PDF e grava em path (escrita atômica).
+    Função de nível de módulo para poder rodar em um ProcessPoolExecutor.
+    """
+    from weasyprint import HTML
+
+    stylesheet, font_config = init_renderer()
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Nome único por chamada: threads do mesmo processo (requests, ZIP e
+    # pré-geração) podem renderizar o mesmo certificado ao mesmo tempo
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        HTML(string=html).write_pdf(
+            tmp_path, stylesheets=[stylesheet], font_config=font_config
+        )
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    _remove_stale(path)
+    return path
+
+
+def _remove_stale(path):
+    """Remove versões antigas do certificado do mesmo participante."""
+    directory, filename = os.path.split(path)
+    prefix = filename.split("-", 1)[0] + "-"
+    for other in os.listdir(directory):
+        if other.startswith(prefix) and other.endswith(".pdf") and other != filename:
+            try:
+                os.remove(os.path.join(directory, other))
+            except FileNotFoundError:
+                pass
+
+
+def render_pool():
+    """Pool de processos de renderização (criado no primeiro uso)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context(
+                    "forkserver" if "forkserver" in methods else "spawn"
+                )
+                _pool = ProcessPoolExecutor(
+                    max_workers=max(1, app.config.get("CERTIFICATE_WORKERS", 4)),
+                    initializer=init_renderer,
+                    mp_context=context,
+                )
+    return _pool
+
+
+def _discard_pool(pool):
+    """Descarta um pool quebrado (processo morto); o próximo uso cria outro."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def certificate_file(event, user):
+    """Retorna o caminho do PDF do certificado, renderizando só em caso de miss."""
+    html = render_html(event, event.organizer.name, user.name)
+    path = cache_path(event.id, user.id, html)
+    if not os.path.exists(path):
+        render_to_file(html, path)
+    return path
+
+
+def invalidate_event(event_id):
+    """Apaga os certificados em cache de um evento (edição/remoção do evento)."""
+    directory = _event_dir(event_id)
+    if not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        try:
+            os.remove(os.path.join(directory, filename))
+        except FileNotFoundError:
+            pass
+
+
+def event_certificates(event):
+    """
+    Certificados de todos os inscritos do evento, como uma lista de dicts com
+    user_id, user_name, html, path e cached (PDF já existe em disco).
+    """
+    participants = db.session.execute(
+        select(User.id, User.name)
+        .join(inscriptions, inscriptions.c.user_id == User.id)
+        .where(inscriptions.c.event_id == event.id)
+        .order_by(User.name)
+    ).all()
+    organizer_name = event.organizer.name
+    result = []
+    for user_id, user_name in participants:
+        html = render_html(event, organizer_name, user_name)
+        path = cache_path(event.id, user_id, html)
+        result.append(
+            {
+                "user_id": user_id,
+                "user_name": user_name,
+                "html": html,
+                "path": path,
+                "cached": os.path.exists(path),
+            }
+        )
+    return result
+
+
+def _render_pending(pending):
+    """
+    Renderiza os certificados pendentes no pool de processos e gera
+    (certificado, erro) à medida que cada um fica pronto.
+    """
+    if not pending:
+        return
+    pool = render_pool()
+    futures = {}
+    try:
+        for item in pending:
+            futures[pool.submit(render_to_file, item["html"], item["path"])] = item
+        for future in as_completed(futures):
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                _discard_pool(pool)
+            yield futures[future], error
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # Cliente desconectado no meio do ZIP: descarta o que não começou (o
+        # pool continua para as próximas exportações)
+        for future in futures:
+            future.cancel()
+
+
+def stream_event_zip(certificates):
+    """
+    Gera o ZIP com os certificados em streaming. Os que já estão em cache
+    entram primeiro; os demais entram conforme o pool termina de renderizar.
+    PDFs já são comprimidos, então as entradas são armazenadas sem deflate.
+    """
+
+    def entries():
+        pending = []
+        for item in certificates:
+            # PDF apagado depois da listagem (evento editado): renderiza de novo
+            if item["cached"] and os.path.exists(item["path"]):
+                yield _zip_entry(item)
+            else:
+                pending.append(item)
+        for item, error in _render_pending(pending):
+            if error is not None:
+                warning(f"Erro ao gerar certificado de {item['user_id']}: {error}")
+                continue
+            yield _zip_entry(item)
+
+    return stream_zip(entries())
+
+
+def _zip_entry(item):
+    name = secure_filename(item["user_name"]) or "participante"
+    return f"certificado_{item['user_id']}_{name}.pdf", item["path"], False
+
+
+def job_status(event_id):
+    """Estado da última pré-geração de certificados do evento (ou None)."""
+    with _jobs_lock:
+        job = _jobs.get(event_id)
+        if job:
+            return dict(job)
+    return certificate_job_cache.get(event_id)
+
+
+def _is_stale(job):
+    updated_at = datetime.fromisoformat(job["updated_at"])
+    return (datetime.utcnow() - updated_at).total_seconds() > JOB_STALE_SECONDS
+
+
+def cached_count(event_id):
+    """Quantidade de PDFs do evento já em disco (status sem o estado do job)."""
+    try:
+        return sum(1 for name in os.listdir(_event_dir(event_id)) if name.endswith(".pdf"))
+    except FileNotFoundError:
+        return 0
+
+
+def pregenerate_event(event_id):
+    """
+    Dispara em background a pré-geração dos certificados de todos os
+    inscritos do evento. Retorna o estado do job (não inicia um segundo job
+    se já houver um em andamento para o evento, neste ou em outro worker).
+    """
+    job = job_status(event_id)
+    if job and job["status"] == "running" and not _is_stale(job):
+        return job
+    now = datetime.utcnow().isoformat()
+    with _jobs_lock:
+        if event_id in _jobs:
+            return dict(_jobs[event_id])
+        _jobs[event_id] = job = {
+            "status": "running",
+            "total": None,
+            "cached": None,
+            "rendered": 0,
+            "failed": 0,
+            "started_at": now,
+            "updated_at": now,
+            "finished_at": None,
+        }
+        certificate_job_cache.set(event_id, dict(job))
+    Thread(target=_run_pregeneration, args=(event_id,), daemon=True).start()
+    return dict(job)
+
+
+def _update_job(event_id, **values):
+    with _jobs_lock:
+        job = _jobs[event_id]
+        job.update(values, updated_at=datetime.utcnow().isoformat())
+        certificate_job_cache.set(event_id, dict(job))
+        if job["status"] != "running":
+            # Terminado: daqui em diante o estado fica só no cache
+            del _jobs[event_id]
+
+
+def _run_pregeneration(event_id):
+    try:
+        with app.app_context():
+            event = db.session.get(Event, event_id)
+            certificates = event_certificates(event)
+            db.session.remove()
+            pending = [item for item in certificates if not item["cached"]]
+            _update_job(
+                event_id,
+                total=len(certificates),
+                cached=len(certificates) - len(pending),
+            )
+
+            rendered = failed = 0
+            for item, error in _render_pending(pending):
+                if error is None:
+                    rendered += 1
+                else:
+                    failed += 1
+                    warning(f"Erro ao gerar certificado do evento {event_id}: {error}")
+                _update_job(event_id, rendered=rendered, failed=failed)
+        status = "done"
+    except Exception as e:
+        warning(f"Erro na pré-geração de certificados do evento {event_id}: {e}")
+        status = "error"
+    _update_job(event_id, status=status, finished_at=datetime.utcnow().isoformat())
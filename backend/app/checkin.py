@@ -0,0 +1,117 @@
+from datetime import datetime
+
+from sqlalchemy import and_, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.cache import checkin_code_cache
+from app.models import Activity, Event, Turma, User, inscriptions, activity_attendance
+
+# Caminho rápido do check-in: quando o check-in de um auditório inteiro abre,
+# centenas de requests chegam ao mesmo tempo com o mesmo código. Cada request
+# deve custar uma consulta ao cache e um único INSERT.
+
+
+def lookup_open_code(code):
+    """
+    Resolve um código de check-in aberto para os dados da atividade/evento.
+
+    O resultado fica em cache por código; o INSERT em record_checkin volta a
+    conferir no banco se o código continua aberto, então uma entrada velha
+    nunca permite um check-in indevido.
+    """
+    info = checkin_code_cache.get(code)
+    if info is not None:
+        return info
+
+    organizer = aliased(User)
+    row = db.session.execute(
+        select(
+            Activity.id.label("activity_id"),
+            Activity.title.label("activity_title"),
+            Event.id.label("event_id"),
+            Event.title.label("event_title"),
+            Event.workload.label("workload"),
+            Event.turma_id.label("turma_id"),
+            Turma.name.label("turma_name"),
+            organizer.name.label("organizer_name"),
+            organizer.email.label("organizer_email"),
+        )
+        .join(Event, Activity.event_id == Event.id)
+        .join(organizer, Event.organizer_id == organizer.id)
+        .outerjoin(Turma, Event.turma_id == Turma.id)
+        .where(Activity.check_in_code == code, Activity.check_in_open.is_(True))
+    ).first()
+    if row is None:
+        return None
+
+    info = row._asdict()
+    checkin_code_cache.set(code, info)
+    return info
+
+
+def forget_code(code):
+    """Remove um código do cache (ao abrir/fechar o check-in da atividade)."""
+    if code:
+        checkin_code_cache.delete(code)
+
+
+def _insert_ignore(table):
+    """INSERT ... ON CONFLICT DO NOTHING no dialeto do banco em uso."""
+    if db.engine.dialect.name == "postgresql":
+        return pg_insert(table)
+    return sqlite_insert(table)
+
+
+def record_checkin(user_id, activity_id, code):
+    """
+    Registra a presença com um único INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+
+    O SELECT só produz uma linha se o check-in da atividade continua aberto com
+    este código e se o usuário está inscrito no evento. Retorna True se a
+    presença foi registrada e False caso contrário (não inscrito, presença já
+    registrada ou código fechado); use diagnose_failure para saber o motivo.
+    """
+    source = (
+        select(
+            literal(user_id),
+            Activity.id,
+            literal(datetime.utcnow()),
+        )
+        .join(
+            inscriptions,
+            and_(
+                inscriptions.c.event_id == Activity.event_id,
+                inscriptions.c.user_id == user_id,
+            ),
+        )
+        .where(
+            Activity.id == activity_id,
+            Activity.check_in_code == code,
+            Activity.check_in_open.is_(True),
+        )
+    )
+    stmt = (
+        _insert_ignore(activity_attendance)
+        .from_select(["user_id", "activity_id", "check_in_time"], source)
+        .on_conflict_do_nothing()
+    )
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def diagnose_failure(user, info, code):
+    """
+    Descobre por que record_checkin não inseriu (caminho lento, raro).
+    Retorna (mensagem de erro, status HTTP).
+    """
+    if not user.is_inscribed(info["event_id"]):
+        return "Você não está inscrito neste evento.", 403
+    if user.has_attended(info["activity_id"]):
+        return "Você já fez check-in nesta atividade.", 409
+    # O check-in foi fechado (ou o código trocado) depois de entrar no cache
+    forget_code(code)
+    return "Código de check-in inválido ou expirado.", 404
@@ -32,18 +32,82 @@ class Config(object):
 
     # --- CONFIGURAÇÃO DE E-MAIL ---
     MAIL_SERVER = os.environ.get("MAIL_SERVER", "sandbox.smtp.mailtrap.io")
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
-    MAIL_USE_SSL = False
+    MAIL_PORT = int(os.environ.get("MAIL_PORT", 587))
+    MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "True").lower() == "true"
+    MAIL_USE_SSL = os.environ.get("MAIL_USE_SSL", "False").lower() == "true"
     MAIL_USERNAME = os.environ.get("MAIL_USERNAME")
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
     MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", "nao-responda@upf.eventum.br")
 
+    # --- FILA DE E-MAILS (outbox) ---
+    # Threads que enviam os e-mails pendentes da tabela email_outbox
+    MAIL_WORKERS = int(os.environ.get("MAIL_WORKERS", 2))
+    # Mensagens enviadas por conexão SMTP
+    MAIL_BATCH_SIZE = 50
+    # Tentativas antes de desistir de uma mensagem
+    MAIL_MAX_ATTEMPTS = 5
+    # Espera antes da 1ª nova tentativa; dobra a cada falha (backoff exponencial)
+    MAIL_RETRY_BASE_SECONDS = 60
+    MAIL_RETRY_MAX_SECONDS = 3600
+    # Intervalo máximo entre verificações da fila quando não há novos envios
+    MAIL_POLL_INTERVAL = 5
+
     # Define a pasta 'uploads' dentro do diretório 'app'
     UPLOADED_FILES_DEST = os.path.join(
         os.path.abspath(os.path.dirname(__file__)), "uploads"
     )
 
+    # Envio dos arquivos submetidos pelo servidor web (sendfile), em vez do
+    # Python: "" (desligado), "x-sendfile" (Apache/lighttpd) ou
+    # "x-accel-redirect" (nginx, com uma location internal apontando para a
+    # pasta de uploads em FILE_X_ACCEL_PREFIX)
+    FILE_DOWNLOAD_OFFLOAD = os.environ.get("FILE_DOWNLOAD_OFFLOAD", "").lower()
+    FILE_X_ACCEL_PREFIX = os.environ.get("FILE_X_ACCEL_PREFIX", "/protected-uploads")
+
+    # --- CERTIFICADOS ---
+    # PDFs já renderizados (ver app/certificates.py)
+    CERTIFICATES_CACHE_DIR = os.path.join(
+        os.path.abspath(os.path.dirname(__file__)), "certificates_cache"
+    )
+    # Processos usados na pré-geração em lote dos certificados de um evento
+    CERTIFICATE_WORKERS = int(os.environ.get("CERTIFICATE_WORKERS", os.cpu_count() or 2))
+
+    # --- CACHE ---
+    # Backend dos caches (ver app/cache.py): "memory" (LRU por processo),
+    # "shared" (SQLite visto por todos os workers do gunicorn na mesma
+    # máquina) ou "redis" (requer o pacote redis)
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory").lower()
+    # Limite de entradas antes de remover as menos usadas (memory/shared)
+    CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+    # Arquivo do backend shared; vazio: instance/cache/eventum-cache.sqlite3.
+    # Deve ficar em uma pasta só do usuário da aplicação (o arquivo é criado
+    # com 0600 e recusado se for de outro usuário)
+    CACHE_SHARED_PATH = os.environ.get("CACHE_SHARED_PATH", "")
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # --- SENHAS ---
+    # Método do hash no formato do Werkzeug ("scrypt:N:r:p" ou
+    # "pbkdf2:sha256:iterações"). Hashes gravados com outros parâmetros são
+    # refeitos no próximo login (ver app/passwords.py)
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_SALT_LENGTH = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+    # Threads que calculam hashes (por processo) e pedidos que podem esperar
+    # na fila; além disso o request recebe 503 com Retry-After
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get("PASSWORD_HASH_QUEUE_SIZE", 32))
+    PASSWORD_HASH_RETRY_AFTER = int(os.environ.get("PASSWORD_HASH_RETRY_AFTER", 2))
+    # Hashes simultâneos na máquina, somando todos os workers do servidor; sem
+    # vaga o request recebe 503 na hora em vez de prender o worker. 0 desliga
+    PASSWORD_HASH_SLOTS = int(os.environ.get("PASSWORD_HASH_SLOTS", os.cpu_count() or 2))
+    # Pasta dos arquivos de vaga (só do usuário da aplicação); vazio:
+    # instance/password-slots
+    PASSWORD_HASH_SLOTS_DIR = os.environ.get("PASSWORD_HASH_SLOTS_DIR", "")
+    # Processos que calculam os hashes na importação de contas em lote
+    PASSWORD_IMPORT_WORKERS = int(os.environ.get("PASSWORD_IMPORT_WORKERS", os.cpu_count() or 2))
+    # Senhas aceitas por arquivo na importação (cada uma é um hash de
+    # dezenas a centenas de ms); acima disso o request recebe 413
+    PASSWORD_IMPORT_MAX_HASHES = int(os.environ.get("PASSWORD_IMPORT_MAX_HASHES", 500))
+
 class ProductionConfig(Config):
     DEBUG = False
     TESTING = False
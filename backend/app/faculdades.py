@@ -0,0 +1,176 @@
+import csv
+import heapq
+import os
+import unicodedata
+from bisect import bisect_left
+from functools import lru_cache
+from logging import warning
+from threading import Lock
+
+from flask import json
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.cache import invalidate_tags
+from app.models import Faculdade
+
+# Registro das faculdades em memória.
+#
+# São ~4.900 faculdades que praticamente nunca mudam: em vez de ler o CSV (ou
+# a tabela) a cada request, o registro é carregado uma única vez por processo
+# com um índice por id, um índice ordenado das palavras dos nomes para busca
+# por prefixo (type-ahead, ?q=) e a resposta completa de /api/faculdades já
+# serializada em JSON.
+#
+# A fonte é a tabela faculdade; enquanto ela estiver vazia (antes de rodar
+# populate_faculdades), o próprio CSV, com os mesmos ids.
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "faculdades.csv")
+
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+
+def normalize(text):
+    """Minúsculas e sem acentos, para comparação ("Ciência" -> "ciencia")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    """Palavras normalizadas de um texto (separadas por qualquer não alfanumérico)."""
+    return "".join(c if c.isalnum() else " " for c in normalize(text)).split()
+
+
+def read_csv(path=CSV_PATH):
+    """Faculdades do CSV como dicts (id, name, description, address)."""
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        faculdades = []
+        for i, row in enumerate(reader, start=1):
+            name = row.get("name", "")
+            sigla = row.get("sigla", "")
+            state = row.get("state", "")
+            full_name = f"{name} ({sigla})" if sigla else name
+            faculdades.append(
+                {"id": i, "name": full_name, "description": "", "address": state}
+            )
+    return faculdades
+
+
+def read_table():
+    """Faculdades da tabela faculdade, em ordem de id."""
+    rows = db.session.execute(
+        select(
+            Faculdade.id, Faculdade.name, Faculdade.description, Faculdade.address
+        ).order_by(Faculdade.id)
+    )
+    return [row._asdict() for row in rows]
+
+
+class FaculdadeRegistry:
+    """Faculdades indexadas por id e pelas palavras do nome."""
+
+    def __init__(self, faculdades):
+        self.faculdades = faculdades
+        self.by_id = {faculdade["id"]: faculdade for faculdade in faculdades}
+        self.payload = json.dumps({"faculdades": faculdades})
+
+        # Os índices de busca usam a posição de cada faculdade na ordem
+        # alfabética (rank): ordenar resultados é comparar inteiros
+        names = [normalize(faculdade["name"]) for faculdade in faculdades]
+        self._by_rank = sorted(range(len(faculdades)), key=names.__getitem__)
+        self._names = [names[i] for i in self._by_rank]
+        # (palavra, rank) ordenado: as palavras que começam com um prefixo
+        # formam um intervalo contíguo, encontrado por busca binária
+        self._words = sorted(
+            (word, rank)
+            for rank, i in enumerate(self._by_rank)
+            for word in set(tokenize(faculdades[i]["name"]))
+        )
+        self._keys = [word for word, _ in self._words]
+        # O type-ahead repete os mesmos prefixos ("u", "un", "uni"...)
+        self._search = lru_cache(maxsize=2048)(self._search_uncached)
+
+    def get(self, faculdade_id):
+        return self.by_id.get(faculdade_id)
+
+    def _prefix_matches(self, prefix):
+        """Ranks das faculdades com alguma palavra começando com prefix."""
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + "\uffff", start)
+        return {rank for _, rank in self._words[start:end]}
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        Faculdades cujo nome tem palavras começando com cada termo da busca
+        (sem diferenciar acentos e maiúsculas). Nomes que começam com a busca
+        vêm primeiro; os demais em ordem alfabética.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Começa pelo termo mais longo (intervalo mais estreito)
+        terms.sort(key=len, reverse=True)
+        ranks = self._search(tuple(terms), normalize(query).strip(), limit)
+        return [self.faculdades[self._by_rank[rank]] for rank in ranks]
+
+    def _search_uncached(self, terms, normalized, limit):
+        candidates = self._prefix_matches(terms[0])
+        for term in terms[1:]:
+            if not candidates:
+                return ()
+            candidates &= self._prefix_matches(term)
+
+        # Nomes que começam com a busca também são um intervalo de ranks
+        first = []
+        rank = bisect_left(self._names, normalized)
+        while (
+            len(first) < limit
+            and rank < len(self._names)
+            and self._names[rank].startswith(normalized)
+        ):
+            if rank in candidates:
+                first.append(rank)
+            rank += 1
+        rest = heapq.nsmallest(limit - len(first), candidates.difference(first))
+        return tuple(first + rest)
+
+
+_registry = None
+_registry_lock = Lock()
+
+
+def load():
+    """Carrega o registro da tabela faculdade ou, se vazia, do CSV."""
+    faculdades = []
+    try:
+        faculdades = read_table()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        warning(f"Erro ao ler a tabela faculdade, usando o CSV: {e}")
+    if not faculdades:
+        faculdades = read_csv()
+    return FaculdadeRegistry(faculdades)
+
+
+def registry():
+    """Registro do processo, carregado no primeiro uso."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = load()
+    return _registry
+
+
+def reload():
+    """
+    Descarta o registro (ex.: após popular a tabela faculdade) e invalida
+    a tag "faculdades" (índice de busca de app/search.py e caches das views).
+    """
+    global _registry
+    with _registry_lock:
+        _registry = None
+    invalidate_tags("faculdades")
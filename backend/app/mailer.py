@@ -0,0 +1,265 @@
+import smtplib
+import time
+from datetime import datetime, timedelta
+from logging import warning
+from threading import Event as ThreadEvent, Lock, Thread
+
+from flask_mail import Message
+from sqlalchemy import event, insert
+
+from app import app, db, mail
+from app.models import EmailOutbox
+
+# Fila de e-mails persistente (tabela email_outbox).
+#
+# send_email grava a mensagem na sessão do request, sem commit: ela entra na
+# tabela junto com o restante do request (ou some com o rollback dele), e os
+# workers são acordados depois do commit. Um número fixo de
+# threads (MAIL_WORKERS) busca lotes de mensagens pendentes, abre UMA conexão
+# SMTP por lote e agenda novas tentativas com backoff exponencial gravado no
+# banco (next_attempt_at), sem deixar nenhuma thread dormindo por mensagem.
+# Mensagens pendentes sobrevivem a reinícios do servidor.
+
+PENDING, SENT, FAILED = 1, 2, 3
+
+# Enquanto um worker envia um lote, as mensagens ficam "reservadas" por este
+# tempo, para que outros workers/processos não as peguem de novo
+CLAIM_LEASE = timedelta(minutes=5)
+
+# Falhas da conexão SMTP, e não da mensagem: a mensagem em envio conta uma
+# tentativa e o restante do lote volta para a fila sem gastar tentativas
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+_wakeup = ThreadEvent()
+_workers = []
+_workers_lock = Lock()
+
+_metrics_lock = Lock()
+_metrics = {
+    "sent": 0,
+    "retried": 0,
+    "requeued": 0,
+    "failed": 0,
+    "batches": 0,
+    "started_at": time.monotonic(),
+}
+
+
+def _count(key, amount=1):
+    with _metrics_lock:
+        _metrics[key] += amount
+
+
+def queue_emails(messages):
+    """
+    Enfileira várias mensagens com um único INSERT na sessão atual. Não faz
+    commit: as mensagens são gravadas (e os workers acordados) no próximo
+    commit de quem chama. Cada mensagem é um dict com subject, recipients,
+    text_body e html_body.
+    """
+    sender = app.config.get("MAIL_DEFAULT_SENDER")
+    # INSERT em lote (executemany): em importações são milhares de mensagens
+    db.session.execute(
+        insert(EmailOutbox),
+        [
+            {
+                "subject": m["subject"],
+                "sender": sender,
+                "recipients": ",".join(m["recipients"]),
+                "text_body": m["text_body"],
+                "html_body": m["html_body"],
+            }
+            for m in messages
+        ],
+    )
+    db.session.info["mail_queued"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+def _wake_workers(session):
+    # Só depois do commit as mensagens ficam visíveis para os workers
+    if session.info.pop("mail_queued", False):
+        start_workers()
+        _wakeup.set()
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_queued(session):
+    session.info.pop("mail_queued", None)
+
+
+def queue_email(subject, recipients, text_body, html_body):
+    """Enfileira uma mensagem para envio em background (no commit de quem chama)."""
+    queue_emails(
+        [
+            {
+                "subject": subject,
+                "recipients": recipients,
+                "text_body": text_body,
+                "html_body": html_body,
+            }
+        ]
+    )
+
+
+def start_workers():
+    """Inicia as threads de envio (uma única vez por processo)."""
+    if _workers:
+        return
+    with _workers_lock:
+        if _workers:
+            return
+        for i in range(app.config.get("MAIL_WORKERS", 2)):
+            worker = Thread(target=_worker_loop, name=f"mail-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def _worker_loop():
+    poll_interval = app.config.get("MAIL_POLL_INTERVAL", 5)
+    while True:
+        try:
+            with app.app_context():
+                processed = process_batch()
+        except Exception as e:
+            warning(f"Erro no worker de e-mail: {e}")
+            processed = 0
+        # Lote cheio: provavelmente há mais mensagens, continua sem esperar
+        if processed < app.config.get("MAIL_BATCH_SIZE", 50):
+            _wakeup.wait(timeout=poll_interval)
+            _wakeup.clear()
+
+
+def _claim_batch():
+    """Reserva um lote de mensagens pendentes e retorna seus dados."""
+    now = datetime.utcnow()
+    batch = (
+        EmailOutbox.query.filter(
+            EmailOutbox.status == PENDING, EmailOutbox.next_attempt_at <= now
+        )
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(app.config.get("MAIL_BATCH_SIZE", 50))
+        # No Postgres, workers concorrentes pulam as linhas já reservadas
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    claimed = []
+    for item in batch:
+        # Reserva condicional: se outro worker alterou a linha depois do
+        # SELECT (bancos sem SKIP LOCKED, como o SQLite), ela é ignorada
+        reserved = EmailOutbox.query.filter_by(
+            id=item.id, next_attempt_at=item.next_attempt_at
+        ).update({"next_attempt_at": now + CLAIM_LEASE}, synchronize_session=False)
+        if not reserved:
+            continue
+        claimed.append(
+            {
+                "id": item.id,
+                "attempts": item.attempts,
+                "message": Message(
+                    item.subject,
+                    sender=item.sender,
+                    recipients=item.recipients.split(","),
+                    body=item.text_body,
+                    html=item.html_body,
+                ),
+            }
+        )
+    db.session.commit()
+    return claimed
+
+
+def _retry_delay(attempts):
+    base = app.config.get("MAIL_RETRY_BASE_SECONDS", 60)
+    cap = app.config.get("MAIL_RETRY_MAX_SECONDS", 3600)
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+
+def _record_failure(item, error):
+    attempts = item["attempts"] + 1
+    values = {"attempts": attempts, "last_error": str(error)}
+    if attempts >= app.config.get("MAIL_MAX_ATTEMPTS", 5):
+        values["status"] = FAILED
+        _count("failed")
+        warning(f"Desistindo do envio do e-mail {item['id']}: {error}")
+    else:
+        values["next_attempt_at"] = datetime.utcnow() + _retry_delay(attempts)
+        _count("retried")
+        warning(f"Erro ao enviar e-mail {item['id']} (tentativa {attempts}): {error}")
+    EmailOutbox.query.filter_by(id=item["id"]).update(values)
+
+
+def _release(items, error):
+    """Devolve mensagens não tentadas à fila, sem contar tentativa."""
+    if not items:
+        return
+    EmailOutbox.query.filter(EmailOutbox.id.in_([item["id"] for item in items])).update(
+        {"next_attempt_at": datetime.utcnow() + _retry_delay(1)},
+        synchronize_session=False,
+    )
+    _count("requeued", len(items))
+    warning(f"Conexão SMTP indisponível, {len(items)} e-mails voltam para a fila: {error}")
+
+
+def process_batch():
+    """
+    Envia um lote de mensagens pendentes usando uma única conexão SMTP.
+    Retorna o número de mensagens processadas.
+    """
+    claimed = _claim_batch()
+    if not claimed:
+        return 0
+
+    sent_ids, remaining = [], list(reversed(claimed))
+    try:
+        with mail.connect() as connection:
+            while remaining:
+                item = remaining.pop()
+                try:
+                    connection.send(item["message"])
+                    sent_ids.append(item["id"])
+                except CONNECTION_ERRORS as e:
+                    # A conexão caiu: para o lote em vez de falhar cada
+                    # mensagem restante na conexão morta
+                    _record_failure(item, e)
+                    raise
+                except Exception as e:
+                    _record_failure(item, e)
+    except Exception as e:
+        # Conexão recusada ou perdida: o restante do lote volta para a fila
+        _release(remaining, e)
+
+    if sent_ids:
+        EmailOutbox.query.filter(EmailOutbox.id.in_(sent_ids)).update(
+            {"status": SENT, "sent_at": datetime.utcnow()}, synchronize_session=False
+        )
+    db.session.commit()
+    _count("sent", len(sent_ids))
+    _count("batches")
+    return len(claimed)
+
+
+def outbox_metrics():
+    """Profundidade da fila e vazão de envio deste processo."""
+    pending = EmailOutbox.query.filter_by(status=PENDING).count()
+    oldest = (
+        db.session.query(db.func.min(EmailOutbox.created_at))
+        .filter(EmailOutbox.status == PENDING)
+        .scalar()
+    )
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    uptime = time.monotonic() - metrics.pop("started_at")
+    return {
+        "queue_depth": pending,
+        "oldest_pending_seconds": (
+            (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+        ),
+        "failed_permanently": EmailOutbox.query.filter_by(status=FAILED).count(),
+        "workers": len(_workers),
+        "process": {
+            **metrics,
+            "uptime_seconds": round(uptime, 1),
+            "sent_per_minute": round(metrics["sent"] / uptime * 60, 2) if uptime else 0,
+        },
+    }
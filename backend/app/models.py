@@ -1,12 +1,15 @@
-from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app import db, passwords
 from datetime import datetime
+from sqlalchemy.orm import make_transient_to_detached
 
 # Tabela associativa para a relação muitos-para-muitos entre Usuários (participantes) e Eventos
 inscriptions = db.Table(
     "inscriptions",
     db.Column("user_id", db.Integer, db.ForeignKey("user.id"), primary_key=True),
     db.Column("event_id", db.Integer, db.ForeignKey("event.id"), primary_key=True),
+    # A PK (user_id, event_id) atende buscas por usuário; este índice atende
+    # as buscas por evento (lista de participantes)
+    db.Index("ix_inscriptions_event_id", "event_id"),
 )
 
 # Tabela associativa para a relação M2M (Registro de Presença)
@@ -16,6 +19,8 @@ activity_attendance = db.Table(
     db.Column("user_id", db.Integer, db.ForeignKey("user.id"), primary_key=True),
     db.Column("activity_id", db.Integer, db.ForeignKey("activity.id"), primary_key=True),
     db.Column("check_in_time", db.DateTime, default=datetime.utcnow),
+    # Contagem de presenças por atividade (GROUP BY activity_id)
+    db.Index("ix_activity_attendance_activity_id", "activity_id"),
 )
 
 
@@ -35,31 +40,138 @@ class User(db.Model):
     curso_id = db.Column(db.Integer, db.ForeignKey("curso.id"), nullable=True)
     turma_id = db.Column(db.Integer, db.ForeignKey("turma.id"), nullable=True)
 
+    # Índices da listagem paginada (keyset) em ordem de nome de /api/users,
+    # com ou sem filtro por curso/turma, e da busca por prefixo/igualdade de
+    # lower(name) e lower(email). No Postgres, com collation diferente de
+    # "C", o LIKE 'ab%' só usa o índice com text_pattern_ops
+    __table_args__ = (
+        db.Index("ix_user_name_id", "name", "id"),
+        db.Index("ix_user_curso_id_name_id", "curso_id", "name", "id"),
+        db.Index("ix_user_turma_id_name_id", "turma_id", "name", "id"),
+        db.Index(
+            "ix_user_lower_name",
+            db.func.lower(name).label("lower_name"),
+            postgresql_ops={"lower_name": "text_pattern_ops"},
+        ),
+        db.Index(
+            "ix_user_lower_email",
+            db.func.lower(email).label("lower_email"),
+            postgresql_ops={"lower_email": "text_pattern_ops"},
+        ),
+    )
+
     # Relacionamento: Eventos que este usuário organizou
     organized_events = db.relationship("Event", backref="organizer", lazy="dynamic")
     # Relacionamento: Submissões feitas por este usuário
     submissions = db.relationship("Submission", backref="author", lazy="dynamic")
     # Relacionamento: Eventos nos quais este usuário está inscrito
+    # (carregado apenas quando acessado; para verificar inscrição use is_inscribed)
     inscribed_events = db.relationship(
         "Event",
         secondary=inscriptions,
-        lazy="subquery",
+        lazy="select",
         backref=db.backref("participants", lazy=True),
     )
-    
+
     # Relacionamento: Atividades que este usuário participou (check-in)
+    # (carregado apenas quando acessado; para verificar presença use has_attended)
     attended_activities = db.relationship(
         "Activity",
         secondary=activity_attendance,
-        lazy="subquery",
+        lazy="select",
         backref=db.backref("attendees", lazy=True),
     )
 
+    # Colunas guardadas no cache de sessão (ver views.load_user).
+    # password_hash e reset_token ficam de fora e são lidos do banco sob demanda.
+    PRINCIPAL_FIELDS = (
+        "id",
+        "name",
+        "email",
+        "role",
+        "allow_public_profile",
+        "curso_id",
+        "turma_id",
+    )
+
+    def principal_data(self):
+        """Retorna os dados do usuário que podem ser cacheados entre requests."""
+        return {field: getattr(self, field) for field in self.PRINCIPAL_FIELDS}
+
+    @classmethod
+    def from_principal_data(cls, data):
+        """
+        Reconstrói o usuário a partir do cache sem consultar o banco.
+        O objeto é anexado à sessão atual como persistente (identity map), então
+        alterações são gravadas normalmente e colunas fora do cache são
+        carregadas apenas se forem acessadas.
+        """
+        user = cls(**data)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Calculado no pool de hash; pode levantar passwords.HashingBusy
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
+
+    def upgrade_password(self, password):
+        """
+        Refaz o hash com os parâmetros atuais se o gravado estiver
+        desatualizado. Chamado após um login bem-sucedido (única hora em que
+        a senha em texto está disponível); retorna True se mudou.
+        """
+        if not passwords.needs_rehash(self.password_hash):
+            return False
+        self.set_password(password)
+        return True
+
+    def is_inscribed(self, event_id):
+        """Verifica a inscrição com um EXISTS indexado, sem carregar a coleção."""
+        return db.session.scalar(
+            db.select(
+                db.exists().where(
+                    inscriptions.c.user_id == self.id,
+                    inscriptions.c.event_id == event_id,
+                )
+            )
+        )
+
+    def has_attended(self, activity_id):
+        """Verifica o check-in com um EXISTS indexado, sem carregar a coleção."""
+        return db.session.scalar(
+            db.select(
+                db.exists().where(
+                    activity_attendance.c.user_id == self.id,
+                    activity_attendance.c.activity_id == activity_id,
+                )
+            )
+        )
+
+    def inscribe(self, event_id):
+        """Inscreve o usuário em um evento (INSERT direto na tabela associativa)."""
+        db.session.execute(
+            inscriptions.insert().values(user_id=self.id, event_id=event_id)
+        )
+
+    def attend(self, activity_id):
+        """Registra o check-in do usuário em uma atividade."""
+        db.session.execute(
+            activity_attendance.insert().values(
+                user_id=self.id, activity_id=activity_id
+            )
+        )
+
+    def unsubscribe(self, event_id):
+        """Cancela a inscrição do usuário em um evento."""
+        db.session.execute(
+            inscriptions.delete().where(
+                inscriptions.c.user_id == self.id,
+                inscriptions.c.event_id == event_id,
+            )
+        )
 
     # Métodos exigidos pelo Flask-Login
     def is_authenticated(self):
@@ -129,6 +241,24 @@ class Event(db.Model):
     faculdade_id = db.Column(db.Integer, db.ForeignKey("faculdade.id"), nullable=True)
     # Ou por uma Turma (ex: Evento de uma turma específica)
     turma_id = db.Column(db.Integer, db.ForeignKey("turma.id"), nullable=True)
+    # Data da última modificação (usada no ETag do calendário)
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    # Índices compostos para a listagem paginada (keyset) de eventos publicados
+    # em /api/events, com ou sem filtro por vínculo acadêmico
+    __table_args__ = (
+        db.Index("ix_event_status_start_date_id", "status", "start_date", "id"),
+        db.Index(
+            "ix_event_faculdade_status_start_date",
+            "faculdade_id",
+            "status",
+            "start_date",
+        ),
+        db.Index("ix_event_curso_status_start_date", "curso_id", "status", "start_date"),
+        db.Index("ix_event_turma_status_start_date", "turma_id", "status", "start_date"),
+    )
 
     def to_dict(self):
         return {
@@ -186,8 +316,32 @@ class Activity(db.Model):
     # Campos para controle de presença 
     check_in_open = db.Column(db.Boolean, default=False, nullable=False)
     check_in_code = db.Column(db.String(10), nullable=True) # Código numérico curto
+    # Data da última modificação (usada no ETag do calendário)
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
 
-    def to_dict(self):
+    # Índices para o calendário (janela de datas), para a programação do evento
+    # e para localizar a atividade pelo código de check-in
+    __table_args__ = (
+        db.Index("ix_activity_start_time", "start_time"),
+        db.Index("ix_activity_event_id_start_time", "event_id", "start_time"),
+        db.Index("ix_activity_check_in_code", "check_in_code"),
+    )
+
+    def count_attendees(self):
+        """Conta os check-ins da atividade sem carregar os usuários."""
+        return db.session.scalar(
+            db.select(db.func.count())
+            .select_from(activity_attendance)
+            .where(activity_attendance.c.activity_id == self.id)
+        )
+
+    def to_dict(self, attendees_count=None):
+        # Listagens devem passar a contagem já calculada em lote
+        # (ver serializers.activity_attendance_counts)
+        if attendees_count is None:
+            attendees_count = self.count_attendees()
         return {
             "id": self.id,
             "title": self.title,
@@ -199,7 +353,7 @@ class Activity(db.Model):
             "check_in_open": self.check_in_open,
             "check_in_code": self.check_in_code,
             # Retorna quantos usuários fizeram check-in
-            "attendees_count": len(self.attendees),
+            "attendees_count": attendees_count,
         }
 
     def __repr__(self):
@@ -211,7 +365,13 @@ class Submission(db.Model):
     title = db.Column(db.String(250), nullable=False)
     file_path = db.Column(
         db.String(255), nullable=False
-    )  # Caminho do arquivo submetido
+    )  # Caminho do arquivo submetido (relativo à pasta de uploads)
+    # Metadados do arquivo gravados pelo armazenamento (app/storage.py).
+    # Nulos em submissões anteriores ao armazenamento por conteúdo.
+    original_filename = db.Column(db.String(255), nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)  # SHA-256 (hex)
+    file_size = db.Column(db.BigInteger, nullable=True)
+    mime_type = db.Column(db.String(100), nullable=True)
     # Status: 1=Submetido, 2=Em avaliação, 3=Aprovado, 4=Rejeitado
     status = db.Column(db.SmallInteger, nullable=False, default=1)
     # Chave estrangeira para o autor
@@ -224,6 +384,7 @@ class Submission(db.Model):
             "id": self.id,
             "title": self.title,
             "file_path": self.file_path,
+            "file_name": self.file_name,
             "status": self.status,
             "author": self.author.to_dict(),
             "author_id": self.author_id,
@@ -231,6 +392,11 @@ class Submission(db.Model):
             "event_id": self.event_id,
         }
 
+    @property
+    def file_name(self):
+        """Nome do arquivo como enviado pelo autor."""
+        return self.original_filename or self.file_path.rsplit("/", 1)[-1]
+
     def __repr__(self):
         return f"<Submission {self.title}>"
 
@@ -315,3 +481,33 @@ class Turma(db.Model):
 
     def __repr__(self):
         return f"<Turma {self.name}>"
+
+
+class EmailOutbox(db.Model):
+    """Fila persistente de e-mails a enviar (processada por app/mailer.py)."""
+
+    __tablename__ = "email_outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(250), nullable=False)
+    sender = db.Column(db.String(150), nullable=True)
+    # Destinatários separados por vírgula
+    recipients = db.Column(db.Text, nullable=False)
+    text_body = db.Column(db.Text, nullable=True)
+    html_body = db.Column(db.Text, nullable=True)
+    # Status: 1=Pendente, 2=Enviado, 3=Falhou (tentativas esgotadas)
+    status = db.Column(db.SmallInteger, nullable=False, default=1)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # Próxima tentativa de envio (backoff exponencial após falhas)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    # Busca das mensagens pendentes que já podem ser enviadas
+    __table_args__ = (
+        db.Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self):
+        return f"<EmailOutbox {self.subject}>"
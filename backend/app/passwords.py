@@ -0,0 +1,334 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from threading import BoundedSemaphore, Lock
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app import app
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem vagas entre processos, só o limite local
+    fcntl = None
+
+# Hash de senhas em um pool de threads limitado.
+#
+# O scrypt/pbkdf2 leva dezenas a centenas de ms de CPU por senha. Em vez de
+# cada worker do servidor calcular o hash no próprio request (o que, num pico
+# de cadastros/logins no início do semestre, ocupa todos os workers), o hash
+# roda em PASSWORD_HASH_WORKERS threads (o hashlib libera o GIL durante a
+# derivação) com no máximo PASSWORD_HASH_QUEUE_SIZE pedidos esperando. Com a
+# fila cheia o pedido é recusado na hora com HashingBusy, que a view responde
+# com 503 e Retry-After.
+#
+# O request continua esperando o próprio hash, e com workers síncronos do
+# gunicorn (um request por processo) a fila local nunca enche. Por isso a
+# admissão também é global: cada hash ocupa uma de PASSWORD_HASH_SLOTS vagas
+# compartilhadas por todos os processos da máquina (um flock em um arquivo
+# por vaga, liberado pelo sistema se o processo morrer). Sem vaga livre o
+# pedido recebe HashingBusy na hora e o worker fica livre para outros
+# requests, em vez de esperar atrás de scrypts dos outros workers.
+#
+# A importação de contas em lote (hash_many) usa um pool de processos à
+# parte, criado uma vez por processo com forkserver (ou spawn): um fork do
+# worker do servidor copiaria as threads, locks e conexões abertas nele.
+#
+# Os parâmetros do hash (PASSWORD_HASH_METHOD, PASSWORD_SALT_LENGTH) são
+# configuráveis; hashes gravados com parâmetros antigos são refeitos no
+# próximo login bem-sucedido (ver needs_rehash).
+
+
+class HashingBusy(Exception):
+    """Fila de hash cheia: o cliente deve tentar de novo após retry_after s."""
+
+    def __init__(self, retry_after):
+        super().__init__("Fila de hash de senhas cheia.")
+        self.retry_after = retry_after
+
+
+_executor = None
+_slots = None
+_shared_slots = None
+_import_executor = None
+_executor_lock = Lock()
+
+_metrics_lock = Lock()
+_metrics = {"hashed": 0, "verified": 0, "rejected": 0, "busy_seconds": 0.0}
+
+
+class SharedSlots:
+    """
+    Semáforo entre processos: count arquivos em uma pasta só do usuário da
+    aplicação, e uma vaga ocupada é um flock exclusivo em um deles.
+    """
+
+    def __init__(self, directory, count):
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.pid = os.getpid()
+        self._fds = []
+        self._held = set()
+        self._lock = Lock()
+        for i in range(count):
+            path = os.path.join(directory, f"slot-{i}")
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+            self._fds.append(fd)
+            info = os.fstat(fd)
+            if info.st_uid != os.getuid():
+                self.close()
+                raise RuntimeError(f"{path} pertence a outro usuário (uid {info.st_uid}).")
+
+    def acquire(self):
+        """Ocupa uma vaga livre sem esperar; None se todas estão ocupadas."""
+        with self._lock:
+            for fd in self._fds:
+                # O flock é por arquivo aberto: outra thread deste processo
+                # "conseguiria" de novo a vaga que ele já tem
+                if fd in self._held:
+                    continue
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                self._held.add(fd)
+                return fd
+        return None
+
+    def release(self, fd):
+        with self._lock:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            self._held.discard(fd)
+
+    def in_use(self):
+        """Vagas ocupadas na máquina (por este e pelos outros processos)."""
+        busy = 0
+        with self._lock:
+            for fd in self._fds:
+                if fd in self._held:
+                    busy += 1
+                    continue
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    busy += 1
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        return busy
+
+    def close(self):
+        for fd in self._fds:
+            os.close(fd)
+        self._fds = []
+
+
+def _count(key, amount=1):
+    with _metrics_lock:
+        _metrics[key] += amount
+
+
+def _pool():
+    """Pool de threads e vagas de admissão (criados no primeiro uso)."""
+    global _executor, _slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = app.config["PASSWORD_HASH_WORKERS"]
+                # Vagas = hashes em andamento + pedidos esperando na fila
+                _slots = BoundedSemaphore(workers + app.config["PASSWORD_HASH_QUEUE_SIZE"])
+                _executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="password-hash"
+                )
+    return _executor, _slots
+
+
+def _global_slots():
+    """
+    Vagas compartilhadas entre processos (None se desligadas). Os arquivos
+    são abertos por processo: um descritor herdado no fork dividiria o
+    flock com o processo pai.
+    """
+    global _shared_slots
+    count = app.config["PASSWORD_HASH_SLOTS"]
+    if not count or fcntl is None:
+        return None
+    if _shared_slots is None or _shared_slots.pid != os.getpid():
+        with _executor_lock:
+            if _shared_slots is None or _shared_slots.pid != os.getpid():
+                directory = app.config["PASSWORD_HASH_SLOTS_DIR"] or os.path.join(
+                    app.instance_path, "password-slots"
+                )
+                _shared_slots = SharedSlots(directory, count)
+    return _shared_slots
+
+
+def _import_pool():
+    """Pool de processos da importação em lote (criado no primeiro uso)."""
+    global _import_executor
+    if _import_executor is None:
+        with _executor_lock:
+            if _import_executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context(
+                    "forkserver" if "forkserver" in methods else "spawn"
+                )
+                _import_executor = ProcessPoolExecutor(
+                    max_workers=app.config["PASSWORD_IMPORT_WORKERS"], mp_context=context
+                )
+    return _import_executor
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        _count("busy_seconds", time.perf_counter() - start)
+
+
+def _run(func, *args):
+    """
+    Executa func no pool e espera o resultado; HashingBusy se não há vaga
+    global ou se a fila deste processo está cheia.
+    """
+    executor, slots = _pool()
+    shared = _global_slots()
+    slot = shared.acquire() if shared is not None else None
+    if shared is not None and slot is None:
+        _count("rejected")
+        raise HashingBusy(app.config["PASSWORD_HASH_RETRY_AFTER"])
+    try:
+        if not slots.acquire(blocking=False):
+            _count("rejected")
+            raise HashingBusy(app.config["PASSWORD_HASH_RETRY_AFTER"])
+        try:
+            future = executor.submit(_timed, func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future.result()
+    finally:
+        if slot is not None:
+            shared.release(slot)
+
+
+def hash_password(password):
+    """Hash da senha com os parâmetros configurados."""
+    pwhash = _run(
+        generate_password_hash,
+        password,
+        app.config["PASSWORD_HASH_METHOD"],
+        app.config["PASSWORD_SALT_LENGTH"],
+    )
+    _count("hashed")
+    return pwhash
+
+
+def verify_password(pwhash, password):
+    """Confere a senha com o hash gravado."""
+    if not pwhash:
+        return False
+    ok = _run(check_password_hash, pwhash, password)
+    _count("verified")
+    return ok
+
+
+def _hash_chunk(passwords, method, salt_length):
+    """Função de nível de módulo para poder rodar em um ProcessPoolExecutor."""
+    return [generate_password_hash(password, method, salt_length) for password in passwords]
+
+
+def hash_many(passwords):
+    """
+    Hashes de muitas senhas de uma vez (importação de contas em lote), no
+    pool de PASSWORD_IMPORT_WORKERS processos, na mesma ordem. Não passa
+    pela fila dos requests: quem chama limita a quantidade (ver
+    PASSWORD_IMPORT_MAX_HASHES em app/provisioning.py).
+    """
+    global _import_executor
+    if not passwords:
+        return []
+    method = app.config["PASSWORD_HASH_METHOD"]
+    salt_length = app.config["PASSWORD_SALT_LENGTH"]
+    workers = max(1, min(app.config["PASSWORD_IMPORT_WORKERS"], len(passwords)))
+    if workers == 1:
+        result = _hash_chunk(passwords, method, salt_length)
+    else:
+        # Alguns blocos por processo, para equilibrar a carga sem mandar uma
+        # tarefa por senha
+        size = -(-len(passwords) // (workers * 4))
+        chunks = [passwords[i : i + size] for i in range(0, len(passwords), size)]
+        pool = _import_pool()
+        try:
+            hashed = pool.map(
+                _hash_chunk, chunks, [method] * len(chunks), [salt_length] * len(chunks)
+            )
+            result = [pwhash for chunk in hashed for pwhash in chunk]
+        except BrokenProcessPool:
+            # Um processo morreu (ex.: OOM): a próxima importação cria outro pool
+            with _executor_lock:
+                if _import_executor is pool:
+                    _import_executor = None
+            raise
+    _count("hashed", len(result))
+    return result
+
+
+@lru_cache(maxsize=8)
+def _canonical_method(method):
+    # "scrypt" é gravado como "scrypt:32768:8:1", "pbkdf2" como
+    # "pbkdf2:sha256:600000" etc. (os padrões dependem da versão do
+    # Werkzeug). Com todos os parâmetros informados (o padrão da
+    # configuração) o método já é a forma gravada; senão a forma completa vem
+    # de um hash de teste no pool, uma vez por processo (HashingBusy não fica
+    # no cache)
+    name, *params = method.split(":")
+    if (name == "scrypt" and len(params) == 3) or (name == "pbkdf2" and len(params) == 2):
+        return ":".join([name, *(str(int(p)) if p.isdigit() else p for p in params)])
+    return _run(generate_password_hash, "", method, 1).split("$", 1)[0]
+
+
+def needs_rehash(pwhash):
+    """
+    True se o hash foi gerado com parâmetros diferentes dos configurados
+    (método, custo ou tamanho do salt) e deve ser refeito no próximo login.
+    """
+    if not pwhash or pwhash.count("$") < 2:
+        return False
+    method, salt, _ = pwhash.split("$", 2)
+    return (
+        method != _canonical_method(app.config["PASSWORD_HASH_METHOD"])
+        or len(salt) < app.config["PASSWORD_SALT_LENGTH"]
+    )
+
+
+def reset_pool():
+    """Encerra os pools; o próximo hash cria outros com a configuração atual."""
+    global _executor, _slots, _shared_slots, _import_executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        if _import_executor is not None:
+            _import_executor.shutdown(wait=True)
+        if _shared_slots is not None and _shared_slots.pid == os.getpid():
+            _shared_slots.close()
+        _executor = _slots = _shared_slots = _import_executor = None
+    _canonical_method.cache_clear()
+
+
+def pool_metrics():
+    """Contadores do pool de hash deste processo."""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics["busy_seconds"] = round(metrics["busy_seconds"], 3)
+    metrics["workers"] = app.config["PASSWORD_HASH_WORKERS"]
+    metrics["queue_size"] = app.config["PASSWORD_HASH_QUEUE_SIZE"]
+    shared = _global_slots()
+    metrics["slots"] = app.config["PASSWORD_HASH_SLOTS"] if shared is not None else 0
+    metrics["slots_in_use"] = shared.in_use() if shared is not None else 0
+    metrics["method"] = app.config["PASSWORD_HASH_METHOD"]
+    return metrics
+
@@ -2,9 +2,8 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import db, app
+from app import db, app, faculdades
 from app.models import Faculdade, Curso
-import csv
 
 def populate_faculdades():
     """Popula faculdades do CSV se não existirem."""
@@ -13,22 +12,12 @@ def populate_faculdades():
         return
 
     try:
-        with open("app/faculdades.csv", "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for i, row in enumerate(reader, start=1):
-                name = row.get("name", "")
-                sigla = row.get("sigla", "")
-                state = row.get("state", "")
-                full_name = f"{name} ({sigla})" if sigla else name
-                faculdade = Faculdade(
-                    id=i,
-                    name=full_name,
-                    description="",
-                    address=state
-                )
-                db.session.add(faculdade)
-            db.session.commit()
-            print("Faculdades populadas.")
+        for row in faculdades.read_csv():
+            db.session.add(Faculdade(**row))
+        db.session.commit()
+        # O registro em memória passa a ler da tabela
+        faculdades.reload()
+        print("Faculdades populadas.")
     except FileNotFoundError:
         print("Arquivo faculdades.csv não encontrado.")
 
@@ -0,0 +1,252 @@
+import csv
+import io
+import secrets
+
+from markupsafe import escape
+from sqlalchemy import func, insert, select
+
+from app import app, db, mailer, passwords
+from app.models import Curso, Turma, User
+from app.roster import summarize  # noqa: F401 (contagem por status das views)
+
+# Criação de contas de alunos em lote (turma ingressante).
+#
+# O CSV (name, email e, opcionalmente, curso_id, turma_id e password) é
+# validado de uma vez: cursos, turmas e e-mails já cadastrados são
+# verificados com uma consulta cada. Senhas informadas têm o hash calculado
+# em um pool de processos (passwords.hash_many), até PASSWORD_IMPORT_MAX_HASHES
+# por arquivo; sem senha, a conta recebe
+# um token de redefinição e o aluno escolhe a senha pelo link do e-mail de
+# boas-vindas. As contas entram com um único COPY (Postgres/psycopg2) ou um
+# INSERT em lote, e os e-mails vão para a fila com um único commit, junto
+# com as contas.
+
+IMPORT_MAX_ROWS = 10000
+CREATED, EXISTS, DUPLICATE, INVALID = "created", "exists", "duplicate", "invalid"
+RESET_PASSWORD_URL = "http://localhost:3000/reset-password?token={token}"
+
+# Colunas gravadas (e a ordem delas no COPY)
+USER_COLUMNS = (
+    "name",
+    "email",
+    "role",
+    "allow_public_profile",
+    "password_hash",
+    "reset_token",
+    "curso_id",
+    "turma_id",
+)
+
+
+class ProvisioningError(ValueError):
+    """Arquivo inválido como um todo (colunas faltando, linhas demais etc.)."""
+
+
+class TooManyPasswords(ProvisioningError):
+    """Mais senhas no arquivo do que PASSWORD_IMPORT_MAX_HASHES."""
+
+
+def read_students_csv(stream):
+    """Linhas do CSV como dicts com as chaves do cabeçalho em minúsculas."""
+    try:
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig")
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None:
+            return []
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        missing = {"name", "email"} - set(reader.fieldnames)
+        if missing:
+            raise ProvisioningError(
+                f"Colunas obrigatórias ausentes: {', '.join(sorted(missing))}."
+            )
+        rows = []
+        for row in reader:
+            if any((value or "").strip() for value in row.values() if isinstance(value, str)):
+                rows.append(row)
+            if len(rows) > IMPORT_MAX_ROWS:
+                raise ProvisioningError(f"Máximo de {IMPORT_MAX_ROWS} alunos por arquivo.")
+        return rows
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ProvisioningError(f"CSV inválido: {e}") from e
+
+
+def _optional_int(value):
+    value = (value or "").strip() if isinstance(value, str) else value
+    return int(value) if value not in (None, "") else None
+
+
+def _validate(rows, default_curso_id, default_turma_id):
+    """Normaliza as linhas; retorna (contas, resultados das linhas inválidas)."""
+    accounts = []
+    errors = {}
+    for i, row in enumerate(rows, start=1):
+        name = (row.get("name") or "").strip()
+        email = (row.get("email") or "").strip()
+        try:
+            curso_id = _optional_int(row.get("curso_id"))
+            turma_id = _optional_int(row.get("turma_id"))
+        except ValueError:
+            errors[i] = "curso_id e turma_id devem ser números."
+            continue
+        if not name or "@" not in email:
+            errors[i] = "Nome e e-mail válidos são obrigatórios."
+            continue
+        accounts.append(
+            {
+                "row": i,
+                "name": name,
+                "email": email,
+                "password": (row.get("password") or "").strip() or None,
+                "curso_id": curso_id if curso_id is not None else default_curso_id,
+                "turma_id": turma_id if turma_id is not None else default_turma_id,
+            }
+        )
+    return accounts, errors
+
+
+def _check_links(accounts, errors):
+    """Verifica cursos e turmas com uma consulta cada; a turma define o curso."""
+    curso_ids = {a["curso_id"] for a in accounts if a["curso_id"] is not None}
+    turma_ids = {a["turma_id"] for a in accounts if a["turma_id"] is not None}
+    cursos = set(db.session.scalars(select(Curso.id).where(Curso.id.in_(curso_ids))))
+    turmas = dict(
+        db.session.execute(
+            select(Turma.id, Turma.curso_id).where(Turma.id.in_(turma_ids))
+        ).all()
+    )
+    valid = []
+    for account in accounts:
+        curso_id, turma_id = account["curso_id"], account["turma_id"]
+        if turma_id is not None:
+            if turma_id not in turmas:
+                errors[account["row"]] = f"Turma {turma_id} não encontrada."
+                continue
+            if curso_id is not None and curso_id != turmas[turma_id]:
+                errors[account["row"]] = f"Turma {turma_id} não pertence ao curso {curso_id}."
+                continue
+            account["curso_id"] = turmas[turma_id]
+        elif curso_id is not None and curso_id not in cursos:
+            errors[account["row"]] = f"Curso {curso_id} não encontrado."
+            continue
+        valid.append(account)
+    return valid
+
+
+def _copy_users(records):
+    """Grava as contas com COPY ... FROM STDIN (Postgres com psycopg2)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # No formato csv do COPY, um campo vazio sem aspas é NULL
+    writer.writerows([record[column] for column in USER_COLUMNS] for record in records)
+    buffer.seek(0)
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY "user" ({", ".join(USER_COLUMNS)}) FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _insert_users(records):
+    engine = db.session.get_bind()
+    if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+        _copy_users(records)
+    else:
+        db.session.execute(insert(User), records)
+
+
+def _welcome_email(account):
+    if account["reset_token"]:
+        url = RESET_PASSWORD_URL.format(token=account["reset_token"])
+        text = f"Para escolher sua senha, acesse: {url}"
+        html = f"<p>Para escolher sua senha, <a href='{url}'>clique aqui</a>.</p>"
+    else:
+        text = "Use a senha informada pela sua instituição para entrar."
+        html = f"<p>{text}</p>"
+    return {
+        "subject": "Bem-vindo(a) ao Eventum!",
+        "recipients": [account["email"]],
+        "text_body": f"Olá {account['name']},\n\nSua conta na plataforma Eventum foi criada.\n{text}",
+        "html_body": f"<p>Olá {escape(account['name'])},</p><p>Sua conta na plataforma Eventum foi criada.</p>{html}",
+    }
+
+
+def provision_students(rows, default_curso_id=None, default_turma_id=None):
+    """
+    Cria as contas de alunos (role 3) das linhas do CSV e enfileira os
+    e-mails de boas-vindas, com um único commit. Retorna um dict por linha:
+    row, email, status (created, exists, duplicate, invalid) e error.
+    """
+    # Limita o trabalho de hash de um único request antes de qualquer consulta
+    max_hashes = app.config["PASSWORD_IMPORT_MAX_HASHES"]
+    if sum(1 for row in rows if (row.get("password") or "").strip()) > max_hashes:
+        raise TooManyPasswords(
+            f"Máximo de {max_hashes} senhas por arquivo. Deixe a coluna password"
+            " vazia para que os alunos escolham a senha pelo e-mail."
+        )
+
+    accounts, errors = _validate(rows, default_curso_id, default_turma_id)
+    accounts = _check_links(accounts, errors)
+
+    # E-mails já cadastrados: uma consulta (índice ix_user_lower_email no Postgres)
+    emails = {account["email"].lower() for account in accounts}
+    existing = set(
+        db.session.scalars(
+            select(func.lower(User.email)).where(func.lower(User.email).in_(emails))
+        )
+    )
+    statuses = {}
+    seen = set()
+    new_accounts = []
+    for account in accounts:
+        email = account["email"].lower()
+        if email in existing:
+            statuses[account["row"]] = EXISTS
+        elif email in seen:
+            statuses[account["row"]] = DUPLICATE
+        else:
+            seen.add(email)
+            new_accounts.append(account)
+
+    with_password = [a for a in new_accounts if a["password"]]
+    for account, pwhash in zip(
+        with_password, passwords.hash_many([a["password"] for a in with_password])
+    ):
+        account["password_hash"] = pwhash
+    records = []
+    for account in new_accounts:
+        account.setdefault("password_hash", None)
+        account["reset_token"] = (
+            None if account["password_hash"] else secrets.token_urlsafe(32)
+        )
+        records.append(
+            {
+                "name": account["name"],
+                "email": account["email"],
+                "role": 3,
+                "allow_public_profile": False,
+                "password_hash": account["password_hash"],
+                "reset_token": account["reset_token"],
+                "curso_id": account["curso_id"],
+                "turma_id": account["turma_id"],
+            }
+        )
+        statuses[account["row"]] = CREATED
+
+    if records:
+        _insert_users(records)
+        # Contas e e-mails entram no mesmo commit
+        mailer.queue_emails([_welcome_email(account) for account in new_accounts])
+        db.session.commit()
+
+    results = []
+    for i, row in enumerate(rows, start=1):
+        result = {"row": i, "email": (row.get("email") or "").strip()}
+        if i in errors:
+            result.update(status=INVALID, error=errors[i])
+        else:
+            result["status"] = statuses[i]
+        results.append(result)
+    return results
@@ -0,0 +1,299 @@
+import csv
+import io
+import tempfile
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Activity, Curso, Turma, User, activity_attendance, inscriptions
+
+# Relatórios exportados pelos organizadores.
+#
+# As linhas vêm de um cursor no servidor (stream_results/yield_per; no
+# Postgres o psycopg2 usa um cursor nomeado) e são escritas em pedaços de
+# CSV_CHUNK_SIZE bytes por um gerador, para que o consumo de memória do
+# request não cresça com o número de participantes.
+
+CSV_CHUNK_SIZE = 64 * 1024
+STREAM_BATCH_SIZE = 1000
+
+# Colunas opcionais do CSV de inscritos (?include=curso,turma,attendance)
+PARTICIPANT_OPTIONAL_COLUMNS = {
+    "curso": "Curso",
+    "turma": "Turma",
+    "attendance": "Presenças",
+}
+
+
+def participants_query(event_id, include=()):
+    """SELECT apenas das colunas do CSV de inscritos do evento."""
+    columns = [User.id, User.name, User.email]
+    stmt = select(*columns).join(inscriptions, inscriptions.c.user_id == User.id)
+
+    if "curso" in include:
+        stmt = stmt.outerjoin(Curso, User.curso_id == Curso.id).add_columns(Curso.name)
+    if "turma" in include:
+        stmt = stmt.outerjoin(Turma, User.turma_id == Turma.id).add_columns(Turma.name)
+    if "attendance" in include:
+        # Presenças por usuário nas atividades deste evento, em uma única
+        # agregação (sem uma consulta por participante)
+        attendance = (
+            select(
+                activity_attendance.c.user_id,
+                func.count().label("attended"),
+            )
+            .join(Activity, Activity.id == activity_attendance.c.activity_id)
+            .where(Activity.event_id == event_id)
+            .group_by(activity_attendance.c.user_id)
+            .subquery()
+        )
+        stmt = stmt.outerjoin(attendance, attendance.c.user_id == User.id).add_columns(
+            func.coalesce(attendance.c.attended, 0)
+        )
+
+    return stmt.where(inscriptions.c.event_id == event_id).order_by(User.id)
+
+
+def stream_rows(stmt, batch_size=STREAM_BATCH_SIZE):
+    """
+    Executa stmt com cursor no servidor, buscando batch_size linhas por vez.
+    Executa direto na conexão da sessão: as linhas são tuplas simples, sem
+    passar pela camada de carregamento do ORM.
+    """
+    return db.session.connection().execute(
+        stmt.execution_options(stream_results=True, yield_per=batch_size)
+    )
+
+
+def iter_csv(header, rows, chunk_size=CSV_CHUNK_SIZE):
+    """Gera o CSV em pedaços de ~chunk_size bytes."""
+    buffer = io.StringIO()
+    # Usamos 'excel' para garantir compatibilidade com UTF-8
+    writer = csv.writer(buffer, dialect="excel")
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def participants_csv(event_id, include=()):
+    """CSV dos inscritos do evento, gerado em streaming."""
+    header = ["ID do Participante", "Nome Completo", "Email"]
+    header += [
+        label for key, label in PARTICIPANT_OPTIONAL_COLUMNS.items() if key in include
+    ]
+    return iter_csv(header, stream_rows(participants_query(event_id, include)))
+
+
+# --- Matriz de presença (participante x atividade) ---
+
+REPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+    ),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+PARQUET_BATCH_SIZE = 10_000
+
+
+class ReportFormatUnavailable(Exception):
+    """A dependência opcional do formato pedido não está instalada."""
+
+
+def event_activities(event_id):
+    """Atividades do evento (id, título, início, horas) em ordem cronológica."""
+    rows = db.session.execute(
+        select(Activity.id, Activity.title, Activity.start_time, Activity.end_time)
+        .where(Activity.event_id == event_id)
+        .order_by(Activity.start_time, Activity.id)
+    ).all()
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "start_time": row.start_time,
+            "hours": (
+                (row.end_time - row.start_time).total_seconds() / 3600
+                if row.start_time and row.end_time
+                else 0
+            ),
+        }
+        for row in rows
+    ]
+
+
+def attendance_matrix(event_id, activities):
+    """
+    Gera uma linha por inscrito: (id, nome, email, [presente em cada
+    atividade], atividades presentes, horas presentes).
+
+    Usa duas consultas em streaming ordenadas por user_id (inscritos e
+    presenças nas atividades do evento) e as combina como um merge join, sem
+    carregar a matriz inteira em memória.
+    """
+    position = {activity["id"]: i for i, activity in enumerate(activities)}
+    hours = [activity["hours"] for activity in activities]
+
+    participants = stream_rows(
+        select(User.id, User.name, User.email)
+        .join(inscriptions, inscriptions.c.user_id == User.id)
+        .where(inscriptions.c.event_id == event_id)
+        .order_by(User.id)
+    )
+    attendance = iter(
+        stream_rows(
+            select(activity_attendance.c.user_id, activity_attendance.c.activity_id)
+            .join(Activity, Activity.id == activity_attendance.c.activity_id)
+            .where(Activity.event_id == event_id)
+            .order_by(activity_attendance.c.user_id)
+        )
+    )
+
+    pending = next(attendance, None)
+    for user_id, name, email in participants:
+        attended = [False] * len(activities)
+        # Descarta presenças de quem não está (mais) inscrito
+        while pending is not None and pending.user_id < user_id:
+            pending = next(attendance, None)
+        while pending is not None and pending.user_id == user_id:
+            # Atividade criada depois da primeira consulta (as duas não são
+            # um snapshot único): a presença fica fora desta exportação
+            i = position.get(pending.activity_id)
+            if i is not None:
+                attended[i] = True
+            pending = next(attendance, None)
+        total_hours = sum(h for h, present in zip(hours, attended) if present)
+        yield user_id, name, email, attended, sum(attended), round(total_hours, 2)
+
+
+def _activity_label(activity):
+    start = activity["start_time"]
+    return f"{activity['title']} ({start:%d/%m %H:%M})" if start else activity["title"]
+
+
+def _matrix_header(activities):
+    return (
+        ["ID do Participante", "Nome Completo", "Email"]
+        + [_activity_label(activity) for activity in activities]
+        + ["Atividades Presentes", "Horas Presentes"]
+    )
+
+
+def _flat_rows(matrix):
+    for user_id, name, email, attended, count, hours in matrix:
+        yield [user_id, name, email, *(int(a) for a in attended), count, hours]
+
+
+def attendance_csv(event_id):
+    """Matriz de presença em CSV, gerada em streaming."""
+    activities = event_activities(event_id)
+    return iter_csv(
+        _matrix_header(activities), _flat_rows(attendance_matrix(event_id, activities))
+    )
+
+
+def _stream_temp_file(tmp, chunk_size=CSV_CHUNK_SIZE):
+    """Envia um arquivo temporário em pedaços e o fecha (apaga) no final."""
+    try:
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        tmp.close()
+
+
+def attendance_xlsx(event_id):
+    """
+    Matriz de presença em XLSX. O openpyxl em modo write_only grava as linhas
+    em disco à medida que são adicionadas; o arquivo final é enviado em
+    pedaços a partir de um arquivo temporário.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise ReportFormatUnavailable("Exportação XLSX requer o pacote openpyxl.") from e
+
+    activities = event_activities(event_id)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Presenças")
+    sheet.append(_matrix_header(activities))
+    for user_id, name, email, attended, count, hours in attendance_matrix(
+        event_id, activities
+    ):
+        # Células de ausência ficam vazias: a planilha fica mais legível e o
+        # openpyxl não precisa escrever metade das células
+        sheet.append(
+            [user_id, name, email, *(1 if a else None for a in attended), count, hours]
+        )
+
+    tmp = tempfile.TemporaryFile()
+    workbook.save(tmp)
+    return _stream_temp_file(tmp)
+
+
+def attendance_parquet(event_id):
+    """
+    Matriz de presença em Parquet (colunar), com uma coluna booleana por
+    atividade. Escrita em lotes de PARQUET_BATCH_SIZE linhas.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ReportFormatUnavailable(
+            "Exportação Parquet requer o pacote opcional pyarrow."
+        ) from e
+
+    activities = event_activities(event_id)
+    activity_columns = [
+        f"atividade_{activity['id']}: {activity['title']}" for activity in activities
+    ]
+    schema = pa.schema(
+        [
+            ("participante_id", pa.int64()),
+            ("nome", pa.string()),
+            ("email", pa.string()),
+            *((column, pa.bool_()) for column in activity_columns),
+            ("atividades_presentes", pa.int32()),
+            ("horas_presentes", pa.float64()),
+        ]
+    )
+
+    tmp = tempfile.TemporaryFile()
+    with pq.ParquetWriter(tmp, schema) as writer:
+        batch = []
+        for row in attendance_matrix(event_id, activities):
+            batch.append(row)
+            if len(batch) >= PARQUET_BATCH_SIZE:
+                writer.write_batch(_parquet_batch(pa, schema, batch))
+                batch = []
+        if batch:
+            writer.write_batch(_parquet_batch(pa, schema, batch))
+    return _stream_temp_file(tmp)
+
+
+def _parquet_batch(pa, schema, rows):
+    user_ids, names, emails, attended, counts, hours = zip(*rows)
+    columns = [list(user_ids), list(names), list(emails)]
+    columns += [list(column) for column in zip(*attended)]
+    columns += [list(counts), list(hours)]
+    return pa.record_batch(columns, schema=schema)
+
+
+def attendance_report(event_id, fmt):
+    """Gerador com o conteúdo da matriz de presença no formato pedido."""
+    if fmt == "xlsx":
+        return attendance_xlsx(event_id)
+    if fmt == "parquet":
+        return attendance_parquet(event_id)
+    return attendance_csv(event_id)
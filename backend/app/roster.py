@@ -0,0 +1,127 @@
+import csv
+import io
+from collections import Counter
+
+from sqlalchemy import func, select, update
+
+from app import db
+from app.models import User
+
+# Matrícula em lote de alunos em uma turma.
+#
+# Os alunos chegam como ids ou e-mails (lista JSON ou CSV). Todos são
+# resolvidos com uma única consulta (IN) e a turma de todos é alterada com um
+# único UPDATE ... WHERE id IN (...), em vez de um request, dois SELECTs e um
+# commit por aluno. O resultado traz o status de cada linha recebida. Só
+# alunos (role 3) entram ou saem de turmas por aqui; outros papéis ficam com
+# o status not_student.
+
+ADD, REMOVE = "add", "remove"
+ROSTER_MAX_ROWS = 5000
+STUDENT_ROLE = 3
+
+
+class RosterError(ValueError):
+    """Entrada inválida (CSV ilegível, linhas demais etc.)."""
+
+
+def read_emails_csv(stream):
+    """
+    E-mails de um CSV: a coluna "email" se houver cabeçalho, senão a
+    primeira coluna. Linhas vazias são ignoradas.
+    """
+    try:
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig")
+        rows = [row for row in csv.reader(text) if row and any(cell.strip() for cell in row)]
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise RosterError(f"CSV inválido: {e}") from e
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "email" in header:
+        column = header.index("email")
+        rows = rows[1:]
+    else:
+        column = 0
+    return [row[column].strip() if column < len(row) else "" for row in rows]
+
+
+def apply_roster(turma_id, action, user_ids=None, emails=None):
+    """
+    Adiciona (action="add") ou remove (action="remove") da turma os usuários
+    indicados por user_ids ou emails. Retorna (results, changed_ids), com um
+    dict por linha de entrada: row, o valor recebido (user_id ou email), id
+    do usuário e status. Não faz commit.
+    """
+    if action not in (ADD, REMOVE):
+        raise RosterError("action deve ser 'add' ou 'remove'.")
+    if not (user_ids if user_ids is not None else emails):
+        raise RosterError("Nenhum aluno informado.")
+
+    # Todos os usuários pedidos em uma única consulta
+    stmt = select(User.id, User.email, User.turma_id, User.role)
+    if user_ids is not None:
+        field = "user_id"
+        # Uma string seria percorrida caractere a caractere, e True/1.5
+        # virariam ids válidos com int()
+        if not isinstance(user_ids, list) or not all(
+            isinstance(value, (int, str)) and not isinstance(value, bool)
+            for value in user_ids
+        ):
+            raise RosterError("user_ids deve ser uma lista de inteiros.")
+        try:
+            values = [int(value) for value in user_ids]
+        except ValueError as e:
+            raise RosterError("user_ids deve ser uma lista de inteiros.") from e
+        keys = values
+        stmt = stmt.where(User.id.in_(set(keys)))
+    else:
+        field = "email"
+        if not isinstance(emails, list) or not all(isinstance(value, str) for value in emails):
+            raise RosterError("emails deve ser uma lista de e-mails.")
+        values = [value.strip() for value in emails]
+        keys = [value.lower() for value in values]
+        # lower(email) usa o índice ix_user_lower_email no Postgres
+        stmt = stmt.where(func.lower(User.email).in_(set(keys)))
+    if len(values) > ROSTER_MAX_ROWS:
+        raise RosterError(f"Máximo de {ROSTER_MAX_ROWS} alunos por vez.")
+    found = {
+        row.id if field == "user_id" else row.email.lower(): row
+        for row in db.session.execute(stmt)
+    }
+
+    results = []
+    changed = []
+    seen = set()
+    for i, (value, key) in enumerate(zip(values, keys), start=1):
+        user = found.get(key)
+        result = {"row": i, field: value, "id": user.id if user else None}
+        if user is None:
+            result["status"] = "not_found"
+        elif user.id in seen:
+            result["status"] = "duplicate"
+        elif user.role != STUDENT_ROLE:
+            result["status"] = "not_student"
+        elif action == ADD:
+            result["status"] = "unchanged" if user.turma_id == turma_id else "added"
+        else:
+            result["status"] = "removed" if user.turma_id == turma_id else "not_in_turma"
+        if result["status"] in ("added", "removed"):
+            changed.append(user.id)
+        if user is not None:
+            seen.add(user.id)
+        results.append(result)
+
+    if changed:
+        stmt = update(User).where(User.id.in_(changed), User.role == STUDENT_ROLE)
+        if action == ADD:
+            stmt = stmt.values(turma_id=turma_id)
+        else:
+            stmt = stmt.where(User.turma_id == turma_id).values(turma_id=None)
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+    return results, changed
+
+
+def summarize(results):
+    """Contagem de linhas por status (também usada por app/provisioning.py)."""
+    return dict(Counter(result["status"] for result in results))
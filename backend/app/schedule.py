@@ -0,0 +1,208 @@
+import csv
+import io
+from datetime import date, datetime
+
+from sqlalchemy import insert
+
+from app import db
+from app.models import Activity
+
+# Importação da programação de um evento em lote.
+#
+# As atividades chegam como uma lista JSON, um CSV (title, description,
+# start_time, end_time, location) ou um arquivo iCalendar (.ics, um VEVENT
+# por atividade). Todas são validadas de uma vez contra o período do evento
+# e gravadas com um único INSERT (executemany) na mesma transação: se alguma
+# linha tiver erro, nada é gravado e o relatório aponta os erros de cada
+# linha.
+
+SCHEDULE_MAX_ROWS = 1000
+FIELDS = ("title", "description", "start_time", "end_time", "location")
+# Limites das colunas String(250) de activity
+MAX_LENGTHS = {"title": 250, "location": 250}
+
+
+class ScheduleError(ValueError):
+    """Arquivo inválido como um todo (formato, linhas demais etc.)."""
+
+
+def read_csv(stream):
+    """Atividades de um CSV com cabeçalho (nomes das colunas em FIELDS)."""
+    try:
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig")
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None:
+            return []
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        return [
+            {field: (row.get(field) or "").strip() for field in FIELDS}
+            for row in reader
+            if any((value or "").strip() for value in row.values() if isinstance(value, str))
+        ]
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ScheduleError(f"CSV inválido: {e}") from e
+
+
+def _unfold(text):
+    """Linhas lógicas do iCalendar (continuações começam com espaço/tab)."""
+    lines = []
+    for line in text.splitlines():
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    return lines
+
+
+def _unescape(value):
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == "\\":
+            escaped = next(chars, "")
+            result.append("\n" if escaped in "nN" else escaped)
+        else:
+            result.append(char)
+    return "".join(result)
+
+
+def _ical_datetime(value, params):
+    """
+    DTSTART/DTEND do iCalendar em ISO 8601. Como em create_activity, o
+    fuso (Z ou TZID) é descartado e vale o horário de parede.
+    """
+    value = value.strip().rstrip("Z")
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return date(int(value[:4]), int(value[4:6]), int(value[6:8])).isoformat()
+    return datetime.strptime(value[:15], "%Y%m%dT%H%M%S").isoformat()
+
+
+def read_ical(stream):
+    """Atividades de um arquivo iCalendar: SUMMARY, DESCRIPTION, DTSTART, DTEND e LOCATION."""
+    try:
+        text = stream.read().decode("utf-8-sig")
+    except UnicodeDecodeError as e:
+        raise ScheduleError(f"Arquivo iCalendar inválido: {e}") from e
+    lines = _unfold(text)
+    if not lines or lines[0].strip().upper() != "BEGIN:VCALENDAR":
+        raise ScheduleError("Arquivo iCalendar inválido: falta BEGIN:VCALENDAR.")
+
+    names = {
+        "SUMMARY": "title",
+        "DESCRIPTION": "description",
+        "DTSTART": "start_time",
+        "DTEND": "end_time",
+        "LOCATION": "location",
+    }
+    items = []
+    current = None
+    depth = 0  # VALARM etc. dentro do VEVENT
+    for line in lines:
+        key, _, value = line.partition(":")
+        name, *raw_params = key.split(";")
+        name = name.upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            current, depth = dict.fromkeys(FIELDS, ""), 0
+        elif current is None:
+            continue
+        elif name == "BEGIN":
+            depth += 1
+        elif name == "END" and depth:
+            depth -= 1
+        elif name == "END" and value.upper() == "VEVENT":
+            items.append(current)
+            current = None
+        elif depth == 0 and name in names:
+            params = dict(p.split("=", 1) for p in raw_params if "=" in p)
+            field = names[name]
+            if field in ("start_time", "end_time"):
+                try:
+                    current[field] = _ical_datetime(value, params)
+                except ValueError:
+                    # Fica como texto e aparece no relatório de erros
+                    current[field] = value
+            else:
+                current[field] = _unescape(value)
+    return items
+
+
+def read_file(stream):
+    """Atividades de um arquivo iCalendar ou CSV (detectado pelo conteúdo)."""
+    head = stream.read(64)
+    stream.seek(0)
+    if head.lstrip(b"\xef\xbb\xbf \r\n").upper().startswith(b"BEGIN:VCALENDAR"):
+        return read_ical(stream)
+    return read_csv(stream)
+
+
+def _parse_time(value):
+    parsed = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    # Como em create_activity: horários com fuso viram naive
+    return parsed.replace(tzinfo=None) if parsed.tzinfo is not None else parsed
+
+
+def validate(event, items):
+    """
+    Valida todas as atividades contra o período do evento. Retorna
+    (registros prontos para o INSERT, relatório de erros por linha).
+    """
+    if len(items) > SCHEDULE_MAX_ROWS:
+        raise ScheduleError(f"Máximo de {SCHEDULE_MAX_ROWS} atividades por vez.")
+
+    records = []
+    report = []
+    for i, item in enumerate(items, start=1):
+        errors = []
+        if not isinstance(item, dict):
+            report.append({"row": i, "errors": ["Atividade deve ser um objeto."]})
+            continue
+        title = str(item.get("title") or "").strip()
+        if not title:
+            errors.append("Campo obrigatório: title")
+        for field, limit in MAX_LENGTHS.items():
+            if len(str(item.get(field) or "")) > limit:
+                errors.append(f"{field} excede {limit} caracteres.")
+
+        times = {}
+        for field in ("start_time", "end_time"):
+            value = item.get(field)
+            if not value:
+                errors.append(f"Campo obrigatório: {field}")
+                continue
+            try:
+                times[field] = _parse_time(value)
+            except (TypeError, ValueError):
+                errors.append(f"Data inválida em {field}: {value}")
+        start_time, end_time = times.get("start_time"), times.get("end_time")
+        if start_time and end_time:
+            if end_time <= start_time:
+                errors.append("Horário de fim deve ser após o início.")
+            elif start_time < event.start_date or end_time > event.end_date:
+                errors.append("Horário fora do intervalo do evento.")
+
+        if errors:
+            report.append({"row": i, "title": title, "errors": errors})
+            continue
+        records.append(
+            {
+                "title": title,
+                "description": str(item.get("description") or ""),
+                "start_time": start_time,
+                "end_time": end_time,
+                "location": str(item.get("location") or ""),
+                "event_id": event.id,
+            }
+        )
+    return records, report
+
+
+def import_activities(event, items):
+    """
+    Grava as atividades se todas forem válidas. Retorna (quantidade
+    criada, relatório de erros); com erros, nada é gravado. Não faz commit.
+    """
+    records, report = validate(event, items)
+    if report or not records:
+        return 0, report
+    db.session.execute(insert(Activity), records)
+    return len(records), report
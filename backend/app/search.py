@@ -0,0 +1,223 @@
+from collections import Counter
+from threading import Lock
+
+from sqlalchemy import Integer, and_, case, cast, func, literal, null, or_, select, union_all
+
+from app import db, faculdades
+from app.cache import tag_versions
+from app.faculdades import tokenize
+from app.models import Curso, Faculdade, Turma
+
+# Busca por nome de faculdades, cursos e turmas (type-ahead).
+#
+# A busca ignora acentos e maiúsculas e ordena os resultados em três faixas:
+# nome que começa com a busca, nome com palavras que começam com cada termo
+# e, por fim, nomes parecidos (trigramas, o que tolera erros de digitação),
+# cada faixa pela similaridade e depois pelo nome.
+#
+# No Postgres a consulta usa pg_trgm (word_similarity e o operador %>) sobre
+# immutable_unaccent(lower(name)), com índices GIN criados na migração
+# b7e2f4a6c8d0. Nos demais bancos (SQLite) usa um índice de trigramas em
+# memória, reconstruído quando as tags de cache "faculdades", "cursos" ou
+# "turmas" são invalidadas.
+
+SEARCH_TYPES = ("faculdade", "curso", "turma")
+SEARCH_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+# Fração mínima dos trigramas da busca presentes no nome (como o
+# pg_trgm.word_similarity_threshold padrão)
+SIMILARITY_THRESHOLD = 0.6
+
+
+def trigrams(text, partial_last=False):
+    """
+    Trigramas das palavras de text, no formato do pg_trgm (cada palavra com
+    dois espaços antes e um depois). Com partial_last, a última palavra fica
+    sem o espaço final: ela ainda está sendo digitada e deve casar como
+    prefixo.
+    """
+    words = tokenize(text)
+    grams = set()
+    for i, word in enumerate(words):
+        padded = f"  {word}" if partial_last and i == len(words) - 1 else f"  {word} "
+        grams.update(padded[j : j + 3] for j in range(len(padded) - 2))
+    return grams
+
+
+def _prefix_rank(name, words, normalized_query, terms):
+    """2: nome começa com a busca; 1: cada termo é início de uma palavra."""
+    if name.startswith(normalized_query):
+        return 2
+    if all(any(word.startswith(term) for word in words) for term in terms):
+        return 1
+    return 0
+
+
+class NgramIndex:
+    """Índice invertido de trigramas dos nomes acadêmicos."""
+
+    def __init__(self, documents):
+        # documents: dicts com type, id, name e parent_id
+        self.documents = documents
+        self._words = [tuple(tokenize(doc["name"])) for doc in documents]
+        self._names = [" ".join(words) for words in self._words]
+        self._postings = {}
+        for i, doc in enumerate(documents):
+            for gram in trigrams(doc["name"]):
+                self._postings.setdefault(gram, []).append(i)
+
+    def search(self, query, types=SEARCH_TYPES, parents=None):
+        """
+        Todos os resultados ordenados, como (doc, prefixo, similaridade).
+        parents: {tipo: parent_id} restringe cursos a uma faculdade e turmas
+        a um curso.
+        """
+        terms = tokenize(query)
+        grams = trigrams(query, partial_last=True)
+        if not grams:
+            return []
+        normalized_query = " ".join(terms)
+        parents = parents or {}
+
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+
+        # Se cada termo é início de uma palavra do nome, o nome tem todos os
+        # trigramas da busca, exceto talvez o último (com o espaço final) de
+        # cada termo que não é o último: abaixo disso não há o que verificar
+        prefix_min = len(grams) - (len(terms) - 1)
+        results = []
+        for i, count in shared.items():
+            doc = self.documents[i]
+            if doc["type"] not in types:
+                continue
+            parent_id = parents.get(doc["type"])
+            if parent_id is not None and doc["parent_id"] != parent_id:
+                continue
+            score = count / len(grams)
+            prefix = (
+                _prefix_rank(self._names[i], self._words[i], normalized_query, terms)
+                if count >= prefix_min
+                else 0
+            )
+            if prefix or score >= SIMILARITY_THRESHOLD:
+                results.append((prefix, score, i))
+        results.sort(key=lambda r: (-r[0], -r[1], self._names[r[2]]))
+        return [(self.documents[i], prefix, score) for prefix, score, i in results]
+
+
+_index = None
+_index_versions = None
+_index_lock = Lock()
+INDEX_TAGS = ("faculdades", "cursos", "turmas")
+
+
+def _load_documents():
+    documents = [
+        {"type": "faculdade", "id": f["id"], "name": f["name"], "parent_id": None}
+        for f in faculdades.registry().faculdades
+    ]
+    for model, parent in ((Curso, Curso.faculdade_id), (Turma, Turma.curso_id)):
+        kind = model.__tablename__
+        rows = db.session.execute(select(model.id, model.name, parent))
+        documents.extend(
+            {"type": kind, "id": id_, "name": name, "parent_id": parent_id}
+            for id_, name, parent_id in rows
+        )
+    return documents
+
+
+def ngram_index():
+    """Índice do processo, reconstruído quando as tags de cache mudam."""
+    global _index, _index_versions
+    versions = tag_versions(*INDEX_TAGS)
+    if _index is None or (versions is not None and versions != _index_versions):
+        with _index_lock:
+            if _index is None or (versions is not None and versions != _index_versions):
+                _index = NgramIndex(_load_documents())
+                _index_versions = versions
+    return _index
+
+
+def _postgres_search(query, types, parents, limit, offset):
+    terms = tokenize(query)
+    normalized_query = " ".join(terms)
+    prefix_pattern = f"{normalized_query}%"
+
+    selects = []
+    for kind, model, parent in (
+        ("faculdade", Faculdade, cast(null(), Integer)),
+        ("curso", Curso, Curso.faculdade_id),
+        ("turma", Turma, Turma.curso_id),
+    ):
+        if kind not in types:
+            continue
+        name = func.immutable_unaccent(func.lower(model.name))
+        # Cada termo é o início de alguma palavra do nome
+        term_prefixes = and_(
+            *(or_(name.like(f"{term}%"), name.like(f"% {term}%")) for term in terms)
+        )
+        stmt = select(
+            literal(kind).label("type"),
+            model.id.label("id"),
+            model.name.label("name"),
+            parent.label("parent_id"),
+            case(
+                (name.like(prefix_pattern), 2),
+                (term_prefixes, 1),
+                else_=0,
+            ).label("prefix"),
+            func.word_similarity(normalized_query, name).label("score"),
+        ).where(
+            # %> e os LIKE usam o índice GIN de trigramas
+            or_(name.op("%>")(normalized_query), term_prefixes)
+        )
+        if parents.get(kind) is not None:
+            stmt = stmt.where(parent == parents[kind])
+        selects.append(stmt)
+    if not selects:
+        return []
+
+    combined = union_all(*selects).subquery()
+    rows = db.session.execute(
+        select(combined)
+        .order_by(
+            combined.c.prefix.desc(), combined.c.score.desc(), combined.c.name
+        )
+        .limit(limit)
+        .offset(offset)
+    )
+    return [
+        (
+            {"type": row.type, "id": row.id, "name": row.name, "parent_id": row.parent_id},
+            row.prefix,
+            row.score,
+        )
+        for row in rows
+    ]
+
+
+def search_academic(query, types=SEARCH_TYPES, parents=None, limit=SEARCH_LIMIT, offset=0):
+    """
+    Busca faculdades, cursos e turmas pelo nome. Retorna até limit
+    resultados a partir de offset, como dicts com type, id, name, o id do
+    pai (faculdade_id dos cursos, curso_id das turmas) e score.
+    """
+    parents = parents or {}
+    if not tokenize(query):
+        return []
+    if db.engine.dialect.name == "postgresql":
+        results = _postgres_search(query, types, parents, limit, offset)
+    else:
+        results = ngram_index().search(query, types, parents)[offset : offset + limit]
+
+    parent_keys = {"curso": "faculdade_id", "turma": "curso_id"}
+    items = []
+    for doc, _, score in results:
+        item = {"type": doc["type"], "id": doc["id"], "name": doc["name"]}
+        if doc["type"] in parent_keys:
+            item[parent_keys[doc["type"]]] = doc["parent_id"]
+        item["score"] = round(float(score), 3)
+        items.append(item)
+    return items
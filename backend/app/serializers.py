@@ -0,0 +1,225 @@
+from datetime import datetime, timezone
+
+from flask import json
+from sqlalchemy import func
+from sqlalchemy.orm import configure_mappers, joinedload
+
+from app import app, db
+from app.cache import RawJSON, fragment_cache
+from app.models import (
+    User,
+    Event,
+    Activity,
+    Submission,
+    Curso,
+    inscriptions,
+    activity_attendance,
+)
+
+# Os backrefs (User.curso, Event.organizer, ...) só existem depois que os
+# mappers são configurados
+configure_mappers()
+
+# Grafos de carregamento usados na serialização.
+# Cada endpoint declara o grafo de objetos de que precisa e o aplica
+# na query com .options(*GRAFO). Assim o to_dict() encontra todos os
+# relacionamentos já carregados e não dispara SELECTs preguiçosos
+# (problema N+1).
+#
+# Os relacionamentos serializados são todos muitos-para-um, então usamos
+# joinedload: um único SELECT com LEFT OUTER JOIN, independente do número
+# de linhas retornadas.
+
+# Grafo usado por User.to_dict(): curso -> faculdade e turma
+USER_GRAPH = (
+    joinedload(User.curso).joinedload(Curso.faculdade),
+    joinedload(User.turma),
+)
+
+# Grafo usado por Event.to_dict(): organizador (com seu próprio grafo)
+# e os vínculos acadêmicos do evento
+EVENT_GRAPH = (
+    joinedload(Event.organizer).options(*USER_GRAPH),
+    joinedload(Event.curso),
+    joinedload(Event.faculdade),
+    joinedload(Event.turma),
+)
+
+# Grafo usado por Submission.to_dict(): autor e evento completos
+SUBMISSION_GRAPH = (
+    joinedload(Submission.author).options(*USER_GRAPH),
+    joinedload(Submission.event).options(*EVENT_GRAPH),
+)
+
+
+def event_participants(event_id, graph=USER_GRAPH):
+    """Retorna os participantes inscritos em um evento com o grafo carregado."""
+    return (
+        User.query.join(inscriptions, inscriptions.c.user_id == User.id)
+        .filter(inscriptions.c.event_id == event_id)
+        .options(*graph)
+        .order_by(User.name)
+        .all()
+    )
+
+
+def user_inscribed_events(user_id, graph=EVENT_GRAPH):
+    """Retorna os eventos em que o usuário está inscrito com o grafo carregado."""
+    return (
+        Event.query.join(inscriptions, inscriptions.c.event_id == Event.id)
+        .filter(inscriptions.c.user_id == user_id)
+        .options(*graph)
+        .order_by(Event.start_date.desc())
+        .all()
+    )
+
+
+def activity_attendance_counts(event_id):
+    """
+    Retorna {activity_id: número de check-ins} para todas as atividades de
+    um evento, com um único COUNT(*) ... GROUP BY activity_id.
+    """
+    rows = db.session.execute(
+        db.select(activity_attendance.c.activity_id, func.count())
+        .join(Activity, Activity.id == activity_attendance.c.activity_id)
+        .where(Activity.event_id == event_id)
+        .group_by(activity_attendance.c.activity_id)
+    )
+    return dict(rows.all())
+
+
+def serialize_activities(activities, event_id):
+    """Serializa as atividades de um evento com as contagens de presença em lote."""
+    counts = activity_attendance_counts(event_id)
+    return [a.to_dict(attendees_count=counts.get(a.id, 0)) for a in activities]
+
+
+def serialize(objects):
+    """Converte uma lista de modelos (já carregados) em uma lista de dicts."""
+    return [obj.to_dict() for obj in objects]
+
+
+# --- Projeções enxutas (dashboard) ---
+# Em vez de carregar objetos e chamar to_dict() (que embute organizador,
+# curso, faculdade...), selecionamos só as colunas exibidas.
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def event_summary_query():
+    """SELECT das colunas do resumo de evento (com o nome do organizador)."""
+    return db.select(
+        Event.id,
+        Event.title,
+        Event.start_date,
+        Event.end_date,
+        Event.status,
+        User.id.label("organizer_id"),
+        User.name.label("organizer_name"),
+    ).join(User, User.id == Event.organizer_id)
+
+
+def event_summaries(stmt):
+    """Executa um event_summary_query() e retorna a lista de resumos."""
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "start_date": _isoformat(row.start_date),
+            "end_date": _isoformat(row.end_date),
+            "status": row.status,
+            "organizer": {"id": row.organizer_id, "name": row.organizer_name},
+        }
+        for row in db.session.execute(stmt)
+    ]
+
+
+def upcoming_event_summaries(limit=5):
+    """Próximos eventos publicados (ainda não encerrados)."""
+    return event_summaries(
+        event_summary_query()
+        .where(Event.status == 2, Event.end_date >= datetime.now(timezone.utc))
+        .order_by(Event.start_date.asc())
+        .limit(limit)
+    )
+
+
+def dashboard_snapshot(user_id):
+    """
+    Dados do dashboard de um usuário em três SELECTs de colunas: inscrições,
+    submissões e eventos organizados. Cada lista já vem serializada em JSON;
+    os próximos eventos, iguais para todos, vêm de upcoming_events_json().
+    """
+    inscribed_events = event_summaries(
+        event_summary_query()
+        .join(inscriptions, inscriptions.c.event_id == Event.id)
+        .where(inscriptions.c.user_id == user_id)
+        .order_by(Event.start_date.desc())
+    )
+    organized_events = event_summaries(
+        event_summary_query()
+        .where(Event.organizer_id == user_id)
+        .order_by(Event.start_date.desc())
+    )
+    submissions = [
+        {
+            "id": row.id,
+            "title": row.title,
+            "status": row.status,
+            "event": {"id": row.event_id, "title": row.event_title},
+        }
+        for row in db.session.execute(
+            db.select(
+                Submission.id,
+                Submission.title,
+                Submission.status,
+                Event.id.label("event_id"),
+                Event.title.label("event_title"),
+            )
+            .join(Event, Event.id == Submission.event_id)
+            .where(Submission.author_id == user_id)
+            .order_by(Submission.id.desc())
+        )
+    ]
+    return {
+        "inscribed_events": RawJSON(json.dumps(inscribed_events)),
+        "submissions": RawJSON(json.dumps(submissions)),
+        "organized_events": RawJSON(json.dumps(organized_events)),
+    }
+
+
+def upcoming_events_json():
+    """Próximos eventos já serializados, compartilhados entre todos os usuários."""
+    return json_fragment("upcoming_events", upcoming_event_summaries)
+
+
+# --- Fragmentos de JSON pré-serializados ---
+# Listas globais (iguais para todos os usuários) ficam em fragment_cache já
+# como texto JSON: uma leitura quente não consulta o banco nem serializa nada.
+
+
+def json_fragment(key, factory, ttl=None):
+    """Retorna RawJSON de factory(), em cache compartilhado por `key`."""
+    return fragment_cache.get_or_set(
+        key, lambda: RawJSON(json.dumps(factory())), ttl
+    )
+
+
+def json_object(fields):
+    """Monta o texto de um objeto JSON, embutindo os valores RawJSON como estão."""
+    return (
+        "{"
+        + ",".join(
+            f"{json.dumps(key)}:"
+            + (value if isinstance(value, RawJSON) else json.dumps(value))
+            for key, value in fields.items()
+        )
+        + "}"
+    )
+
+
+def json_response(body, status=200):
+    """Resposta application/json com um corpo já serializado."""
+    return app.response_class(body + "\n", status=status, mimetype="application/json")
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+from logging import warning
+
+import magic
+from flask import request
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename, send_file
+
+from app import app
+from app.archive import should_compress, stream_zip
+
+# Armazenamento dos arquivos submetidos, endereçado pelo conteúdo.
+#
+# O upload é copiado para o disco em pedaços de STORAGE_CHUNK_SIZE bytes
+# enquanto o SHA-256 é calculado, e o tipo MIME é detectado só pelos primeiros
+# SNIFF_SIZE bytes: o consumo de memória por upload é O(tamanho do pedaço).
+# O arquivo final fica em UPLOADED_FILES_DEST/ab/cd/<sha256>.<ext>; arquivos
+# idênticos são gravados uma única vez, e dois autores que enviam
+# "artigo.pdf" não sobrescrevem mais o arquivo um do outro.
+# Submission.file_path guarda o caminho relativo à pasta de uploads.
+#
+# Os downloads (send_stored_file) respondem a Range e usam o SHA-256 como
+# ETag forte, e podem delegar o envio dos bytes ao servidor web
+# (X-Sendfile/X-Accel-Redirect, ver FILE_DOWNLOAD_OFFLOAD).
+
+STORAGE_CHUNK_SIZE = 64 * 1024
+SNIFF_SIZE = 16 * 1024
+
+ALLOWED_SUBMISSION_MIMES = {
+    "application/pdf",
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/rtf",
+    "text/rtf",
+    "application/vnd.oasis.opendocument.text",
+    "text/plain",
+}
+
+StoredFile = namedtuple(
+    "StoredFile", ["path", "sha256", "size", "mime_type", "original_filename"]
+)
+
+
+class FileTypeNotAllowed(Exception):
+    """O conteúdo do upload não corresponde a um tipo de arquivo permitido."""
+
+
+def storage_root():
+    return app.config["UPLOADED_FILES_DEST"]
+
+
+def absolute_path(relative_path):
+    """Caminho absoluto de um arquivo a partir de Submission.file_path."""
+    return os.path.join(storage_root(), relative_path)
+
+
+def content_path(sha256, extension):
+    """Caminho relativo, distribuído em subpastas pelos 4 primeiros dígitos."""
+    filename = f"{sha256}.{extension}" if extension else sha256
+    # Sempre com "/", pois o caminho é gravado no banco
+    return f"{sha256[:2]}/{sha256[2:4]}/{filename}"
+
+
+def save_upload(file, allowed_mimes=ALLOWED_SUBMISSION_MIMES):
+    """
+    Grava um upload (werkzeug FileStorage) no armazenamento.
+    Levanta FileTypeNotAllowed se o tipo MIME detectado não for permitido.
+    """
+    stream = file.stream
+    head = stream.read(SNIFF_SIZE)
+    mime_type = magic.from_buffer(head, mime=True)
+    if mime_type not in allowed_mimes:
+        raise FileTypeNotAllowed(mime_type)
+
+    original_filename = secure_filename(file.filename or "") or "arquivo"
+    extension = (
+        original_filename.rsplit(".", 1)[1].lower() if "." in original_filename else ""
+    )
+
+    root = storage_root()
+    os.makedirs(root, exist_ok=True)
+    # O arquivo temporário fica no mesmo sistema de arquivos do destino, para
+    # que a movimentação final seja um rename atômico
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=root, prefix=".upload-", delete=False) as tmp:
+        try:
+            chunk = head
+            while chunk:
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+                chunk = stream.read(STORAGE_CHUNK_SIZE)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+
+    sha256 = digest.hexdigest()
+    relative_path = content_path(sha256, extension)
+    final_path = absolute_path(relative_path)
+    if os.path.exists(final_path):
+        # Conteúdo já armazenado: reaproveita o arquivo existente
+        os.remove(tmp.name)
+    else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # NamedTemporaryFile cria o arquivo com permissão 0600
+        os.chmod(tmp.name, 0o644)
+        os.replace(tmp.name, final_path)
+
+    return StoredFile(relative_path, sha256, size, mime_type, original_filename)
+
+
+def send_stored_file(relative_path, download_name, mimetype=None, content_hash=None):
+    """
+    Resposta de download de um arquivo armazenado.
+
+    Sem offload, o werkzeug envia o arquivo com suporte a Range e responde
+    304 a If-None-Match. Com FILE_DOWNLOAD_OFFLOAD = "x-sendfile" ou
+    "x-accel-redirect", a aplicação só responde os cabeçalhos (304 continua
+    sendo tratado aqui) e o servidor web envia os bytes via sendfile,
+    tratando também os pedidos de Range.
+    """
+    path = safe_join(storage_root(), relative_path)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+
+    offload = app.config.get("FILE_DOWNLOAD_OFFLOAD")
+    response = send_file(
+        path,
+        request.environ,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=not offload,
+        # O hash do conteúdo identifica os bytes exatamente: ETag forte
+        etag=content_hash or True,
+        use_x_sendfile=bool(offload),
+        response_class=app.response_class,
+    )
+    # Arquivos protegidos por login: nenhum cache compartilhado
+    response.cache_control.private = True
+
+    if not offload:
+        # Anuncia o suporte a Range (retomada de downloads)
+        response.accept_ranges = "bytes"
+    else:
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            response.headers.pop("X-Sendfile", None)
+        elif offload == "x-accel-redirect":
+            # O nginx resolve o caminho em uma location "internal"
+            response.headers.pop("X-Sendfile", None)
+            prefix = app.config.get("FILE_X_ACCEL_PREFIX", "/protected-uploads")
+            response.headers["X-Accel-Redirect"] = f"{prefix.rstrip('/')}/{relative_path}"
+    return response
+
+
+ZIP_READ_SIZE = 1024 * 1024
+
+
+def stream_submissions_zip(submissions):
+    """
+    Gera em streaming um ZIP com os arquivos das submissões. `submissions` é
+    um iterável de (id, file_path, nome do arquivo, nome do autor).
+    Arquivos ausentes no disco são ignorados.
+    """
+
+    def entries():
+        for submission_id, relative_path, file_name, author_name in submissions:
+            path = safe_join(storage_root(), relative_path)
+            if path is None or not os.path.isfile(path):
+                warning(f"Arquivo da submissão {submission_id} não encontrado.")
+                continue
+            author = secure_filename(author_name) or "autor"
+            name = f"{submission_id}_{author}_{file_name}"
+            yield name, path, should_compress(file_name)
+
+    return stream_zip(entries(), chunk_size=ZIP_READ_SIZE)
@@ -1,4 +1,3 @@
-from logging import warning
 from datetime import datetime, timezone
 from flask import (
     url_for,
@@ -8,75 +7,133 @@ from flask import (
     g,
     abort,
     Response,
-    send_from_directory,
+    send_file,
     request,
     make_response,
+    stream_with_context,
 )
-from flask_mail import Message
+from werkzeug.exceptions import NotFound
 from flask_login import login_user, logout_user, current_user, login_required
 from app import app, db, lm, mail
-from werkzeug.utils import secure_filename
-import os
-import magic
 from app.forms import (
     SubmissionEvalForm,
     SubmissionForm,
     allowed_file,
 )
-import time
-import io
-import csv
-from threading import Thread
-from app.models import Activity, Submission, User, Event, Curso, Turma
-from weasyprint import HTML
+from app.models import (
+    Activity,
+    Submission,
+    User,
+    Event,
+    Curso,
+    Faculdade,
+    Turma,
+    inscriptions,
+)
+from app.serializers import (
+    EVENT_GRAPH,
+    SUBMISSION_GRAPH,
+    RawJSON,
+    dashboard_snapshot,
+    event_participants,
+    json_object,
+    json_response,
+    serialize,
+    serialize_activities,
+    upcoming_events_json,
+    user_inscribed_events,
+)
 import secrets
 import string
+import base64
+import hashlib
+from sqlalchemy import func, literal, or_, select, true, tuple_, union_all
+from app import (
+    certificates,
+    checkin,
+    faculdades,
+    mailer,
+    passwords,
+    provisioning,
+    reports,
+    roster,
+    schedule,
+    search,
+    storage,
+)
+from app.cache import (
+    cache_stats,
+    cached,
+    dashboard_cache,
+    event_count_cache,
+    fragment_cache,
+    invalidate_tags,
+    user_cache,
+)
 
 
 # --- Função Helper para Envio de E-mail ---
 def send_email(subject, recipients, text_body, html_body):
-    """Função auxiliar para enviar e-mails assíncrona."""
-    sender = app.config.get("MAIL_DEFAULT_SENDER")
-    msg = Message(subject, sender=sender, recipients=recipients)
-    msg.body = text_body
-    msg.html = html_body
+    """
+    Enfileira um e-mail para envio em background (ver app/mailer.py).
+    Isso impede que o request do usuário (ex: /register) fique travado
+    esperando o servidor SMTP. A mensagem é gravada no próximo commit do
+    request, junto com as alterações dele: chame antes do commit.
+    """
+    mailer.queue_email(subject, recipients, text_body, html_body)
+
+
+# Carrega o utilizador para o Flask-Login
+@lm.user_loader
+def load_user(id):
+    # A maioria dos requests (polling do app mobile) é atendida pelo cache,
+    # sem consultar a tabela user
+    user_id = int(id)
+    data = user_cache.get(user_id)
+    if data is not None:
+        return User.from_principal_data(data)
+    user = db.session.get(User, user_id)
+    if user is not None:
+        user_cache.set(user_id, user.principal_data())
+    return user
 
-    # Obtém o contexto da aplicação atual
-    app_context = app.app_context()
 
-    # Inicia uma thread separada para enviar o e-mail
-    # Isso impede que o request do usuário (ex: /register)
-    # fique travado esperando o servidor SMTP.
-    thr = Thread(target=_send_async_email, args=[app_context, msg])
-    thr.start()
+def invalidate_user(user_id):
+    """Descarta os dados de sessão cacheados de um usuário."""
+    user_cache.delete(user_id)
 
 
-def _send_async_email(app_context, msg):
+def invalidate_dashboard(user_id):
+    """Descarta o dashboard cacheado de um usuário."""
+    dashboard_cache.delete(user_id)
+
+
+def invalidate_event_view(event_id):
+    """Descarta os detalhes cacheados de um evento (GET /api/events/<id>)."""
+    invalidate_tags(f"event:{event_id}")
+
+
+def invalidate_event_caches():
     """
-    Função interna para envio em background (em uma thread).
-    Tenta enviar, espera 60s em caso de falha, e tenta novamente.
+    Descarta os caches que dependem dos dados dos eventos (contagens e
+    primeiras páginas da listagem, próximos eventos, detalhes dos eventos e
+    dashboards). Chamado após criar, editar ou remover eventos.
     """
-    # Precisamos do contexto da aplicação para acessar 'mail' e a configuração
-    with app_context:
-        try:
-            mail.send(msg)
-        except Exception as e:
-            warning(f"Erro ao enviar e-mail (Tentativa 1): {e}")
-            warning("Tentando novamente em 60 segundos...")
-            time.sleep(60)  # Pausa por 1 minuto
-            try:
-                mail.send(msg)
-                warning("E-mail enviado na Tentativa 2.")
-            except Exception as e2:
-                warning(f"Erro ao enviar e-mail (Tentativa 2): {e2}")
-                warning("Desistindo do envio.")
-                # Em produção, logaríamos isso de forma mais robusta
+    event_count_cache.clear()
+    fragment_cache.clear()
+    dashboard_cache.clear()
+    invalidate_tags("events")
 
 
-# Carrega o utilizador para o Flask-Login
-@lm.user_loader
-def load_user(id):
-    return User.query.get(int(id))
+@app.errorhandler(passwords.HashingBusy)
+def password_hashing_busy(e):
+    # Pico de cadastros/logins: melhor recusar logo do que prender o worker
+    response = jsonify(
+        {"error": "Servidor ocupado. Tente novamente em alguns segundos."}
+    )
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
 
 
 # Define o utilizador global 'g.user' antes de cada request
@@ -86,69 +143,259 @@ def before_request():
 
 
 # --- Rotas Principais ---
+EVENTS_PAGE_SIZE = 20
+EVENTS_MAX_PAGE_SIZE = 100
+
+
+def _encode_cursor(start_date, event_id):
+    """Codifica a posição (start_date, id) de um evento em um cursor opaco."""
+    raw = f"{start_date.isoformat()}|{event_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor):
+    """Decodifica um cursor de paginação. Levanta ValueError se inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        start_date, event_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(start_date), int(event_id)
+    except (UnicodeError, ValueError) as e:
+        raise ValueError("Cursor inválido.") from e
+
+
+def _parse_date_arg(name):
+    """Lê um parâmetro de data ISO da query string (naive). Levanta ValueError."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    return dt.replace(tzinfo=None) if dt.tzinfo else dt
+
+
 @app.route("/api/events")
 def list_events():
-    """Página para listar todos os eventos PÚBLICOS."""
+    """
+    Lista os eventos PÚBLICOS, paginados por cursor (keyset) em (start_date, id).
+
+    Parâmetros opcionais: cursor, limit, faculdade_id, curso_id, turma_id,
+    from e to (intervalo de datas, ISO 8601).
+    """
+    limit = max(
+        1,
+        min(
+            request.args.get("limit", EVENTS_PAGE_SIZE, type=int) or EVENTS_PAGE_SIZE,
+            EVENTS_MAX_PAGE_SIZE,
+        ),
+    )
+    filters = {
+        "faculdade_id": request.args.get("faculdade_id", type=int),
+        "curso_id": request.args.get("curso_id", type=int),
+        "turma_id": request.args.get("turma_id", type=int),
+    }
+    try:
+        date_from = _parse_date_arg("from")
+        date_to = _parse_date_arg("to")
+        cursor = request.args.get("cursor")
+        position = _decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": "Parâmetros inválidos.", "details": str(e)}), 400
+
+    # O total não depende do cursor, então é cacheado por combinação de filtros
+    count_key = (
+        tuple(filters.values()),
+        date_from.isoformat() if date_from else None,
+        date_to.isoformat() if date_to else None,
+    )
+    # A primeira página (sem cursor) é a mais pedida: fica em cache já
+    # serializada, por combinação de filtros e tamanho de página
+    page_key = None if position else ("events", limit, *count_key)
+    if page_key:
+        body = fragment_cache.get(page_key)
+        if body is not None:
+            return json_response(body)
+
     # Filtra os eventos para mostrar apenas os com status=2 (Publicado)
-    events = Event.query.filter_by(status=2).order_by(Event.start_date.desc()).all()
-    return jsonify({"events": [event.to_dict() for event in events]})
+    query = Event.query.filter(Event.status == 2)
+    for column, value in filters.items():
+        if value is not None:
+            query = query.filter(getattr(Event, column) == value)
+    if date_from:
+        query = query.filter(Event.end_date >= date_from)
+    if date_to:
+        query = query.filter(Event.start_date <= date_to)
+
+    total = event_count_cache.get_or_set(
+        count_key,
+        lambda: query.with_entities(func.count(Event.id)).scalar(),
+    )
+
+    if position:
+        query = query.filter(tuple_(Event.start_date, Event.id) < position)
+
+    # Busca um item a mais para saber se existe uma próxima página
+    events = (
+        query.options(*EVENT_GRAPH)
+        .order_by(Event.start_date.desc(), Event.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_cursor = _encode_cursor(events[-1].start_date, events[-1].id)
+
+    body = json_object(
+        {"events": serialize(events), "next_cursor": next_cursor, "total": total}
+    )
+    if page_key:
+        fragment_cache.set(page_key, body)
+    return json_response(body)
 
 
 @app.route("/api/calendar")
 def get_calendar():
-    """Retorna itens do calendário: eventos e atividades."""
-    calendar_items = []
-    
-    # Busca eventos publicados
-    events = Event.query.filter_by(status=2).all()
-    for event in events:
-        calendar_items.append({
-            "id": f"event_{event.id}",
-            "title": event.title,
-            "start": event.start_date.isoformat(),
-            "end": event.end_date.isoformat(),
-            "type": "event",
-            "description": event.description,
-            "location": None,  # Eventos podem não ter location específica
-        })
-        
-        # Adiciona atividades do evento
-        for activity in event.activities:
-            calendar_items.append({
-                "id": f"activity_{activity.id}",
-                "title": activity.title,
-                "start": activity.start_time.isoformat(),
-                "end": activity.end_time.isoformat(),
-                "type": "activity",
-                "description": activity.description,
-                "location": activity.location,
-            })
-    
-    return jsonify({"calendar_items": calendar_items})
+    """
+    Retorna itens do calendário: eventos publicados e suas atividades.
+
+    Parâmetros opcionais: from e to (janela de datas, ISO 8601). A resposta
+    leva um ETag forte; clientes que reenviam If-None-Match recebem 304
+    enquanto nada mudar na janela.
+    """
+    try:
+        date_from = _parse_date_arg("from")
+        date_to = _parse_date_arg("to")
+    except ValueError as e:
+        return jsonify({"error": "Parâmetros inválidos.", "details": str(e)}), 400
+
+    # Filtros de janela: itens que se sobrepõem ao intervalo [from, to]
+    event_filters = [Event.status == 2]
+    activity_filters = [Event.status == 2]
+    if date_from:
+        event_filters.append(Event.end_date >= date_from)
+        activity_filters.append(Activity.end_time >= date_from)
+    if date_to:
+        event_filters.append(Event.start_date <= date_to)
+        activity_filters.append(Activity.start_time <= date_to)
+
+    # 1. ETag: versão da janela (última modificação + contagens, para
+    # detectar remoções), calculada em uma única consulta agregada
+    event_version = (
+        select(func.max(Event.updated_at), func.count(Event.id))
+        .where(*event_filters)
+        .subquery()
+    )
+    activity_version = (
+        select(func.max(Activity.updated_at), func.count(Activity.id))
+        .join(Event, Activity.event_id == Event.id)
+        .where(*activity_filters)
+        .subquery()
+    )
+    version = db.session.execute(
+        select(event_version, activity_version).select_from(
+            event_version.join(activity_version, true())
+        )
+    ).one()
+    etag = hashlib.sha1(
+        "|".join(
+            str(v) for v in (request.args.get("from"), request.args.get("to"), *version)
+        ).encode()
+    ).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+
+    # 2. Monta o feed com uma única consulta UNION ALL (eventos + atividades)
+    events = select(
+        literal("event").label("type"),
+        Event.id.label("id"),
+        Event.id.label("event_id"),
+        Event.title.label("title"),
+        Event.start_date.label("start"),
+        Event.end_date.label("end"),
+        Event.description.label("description"),
+        # Eventos podem não ter location específica
+        literal(None, db.String).label("location"),
+    ).where(*event_filters)
+    activities = (
+        select(
+            literal("activity").label("type"),
+            Activity.id,
+            Activity.event_id,
+            Activity.title,
+            Activity.start_time,
+            Activity.end_time,
+            Activity.description,
+            Activity.location,
+        )
+        .join(Event, Activity.event_id == Event.id)
+        .where(*activity_filters)
+    )
+    feed = union_all(events, activities).subquery()
+    rows = db.session.execute(select(feed).order_by(feed.c.start, feed.c.id))
+
+    calendar_items = [
+        {
+            "id": f"{row.type}_{row.id}",
+            "title": row.title,
+            "start": row.start.isoformat(),
+            "end": row.end.isoformat(),
+            "type": row.type,
+            "event_id": row.event_id,
+            "description": row.description,
+            "location": row.location,
+        }
+        for row in rows
+    ]
+
+    response = jsonify({"calendar_items": calendar_items})
+    response.set_etag(etag)
+    # Sempre revalidar: o navegador reenvia If-None-Match automaticamente
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 # --- Rotas Acadêmicas ---
 @app.route("/api/faculdades", methods=["GET"])
 def get_faculdades():
-    """Retorna uma lista de todas as faculdades do CSV."""
-    faculdades = []
+    """
+    Retorna todas as faculdades (resposta já serializada no registro em
+    memória). Com ?q=, busca por prefixo nas palavras do nome, para
+    type-ahead, limitada a ?limit= resultados.
+    """
     try:
-        with open("app/faculdades.csv", "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for i, row in enumerate(reader, start=1):
-                name = row.get("name", "")
-                sigla = row.get("sigla", "")
-                state = row.get("state", "")
-                full_name = f"{name} ({sigla})" if sigla else name
-                faculdades.append(
-                    {"id": i, "name": full_name, "description": "", "address": state}
-                )
+        registry = faculdades.registry()
+    except FileNotFoundError:
+        return jsonify({"error": "Arquivo de faculdades não encontrado"}), 500
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return json_response(registry.payload)
+    limit = max(
+        1,
+        min(
+            request.args.get("limit", faculdades.SEARCH_LIMIT, type=int)
+            or faculdades.SEARCH_LIMIT,
+            faculdades.SEARCH_MAX_LIMIT,
+        ),
+    )
+    return jsonify({"faculdades": registry.search(query, limit)})
+
+
+@app.route("/api/faculdades/<int:faculdade_id>", methods=["GET"])
+def get_faculdade(faculdade_id):
+    """Retorna uma faculdade (ex.: a já selecionada no perfil)."""
+    try:
+        faculdade = faculdades.registry().get(faculdade_id)
     except FileNotFoundError:
         return jsonify({"error": "Arquivo de faculdades não encontrado"}), 500
-    return jsonify({"faculdades": faculdades})
+    if faculdade is None:
+        return jsonify({"error": "Faculdade não encontrada."}), 404
+    return jsonify({"faculdade": faculdade})
 
 
 @app.route("/api/cursos", methods=["GET"])
+@cached("cursos", tags=("cursos",), ttl=300)
 def get_cursos():
     """Retorna uma lista de todos os cursos."""
     cursos = Curso.query.order_by(Curso.name).all()
@@ -170,10 +417,53 @@ def create_curso():
     curso = Curso(name=data["name"], faculdade_id=data["faculdade_id"])
     db.session.add(curso)
     db.session.commit()
+    invalidate_tags("cursos")
     return jsonify({"curso": curso.to_dict()})
 
 
+@app.route("/api/search/academic", methods=["GET"])
+def search_academic():
+    """
+    Busca faculdades, cursos e turmas pelo nome (type-ahead), sem diferenciar
+    acentos e maiúsculas e tolerando erros de digitação.
+
+    Parâmetros: q, types (ex: "curso,turma"; padrão todos), faculdade_id
+    (restringe os cursos), curso_id (restringe as turmas), limit e offset.
+    """
+    query = request.args.get("q", "").strip()
+    types = request.args.get("types")
+    types = tuple(types.split(",")) if types else search.SEARCH_TYPES
+    invalid = set(types) - set(search.SEARCH_TYPES)
+    if invalid:
+        return (
+            jsonify({"error": f"Tipos inválidos: {', '.join(sorted(invalid))}."}),
+            400,
+        )
+    limit = max(
+        1,
+        min(
+            request.args.get("limit", search.SEARCH_LIMIT, type=int)
+            or search.SEARCH_LIMIT,
+            search.SEARCH_MAX_LIMIT,
+        ),
+    )
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    parents = {
+        "curso": request.args.get("faculdade_id", type=int),
+        "turma": request.args.get("curso_id", type=int),
+    }
+
+    # Busca um item a mais para saber se existe uma próxima página
+    results = search.search_academic(query, types, parents, limit + 1, offset)
+    next_offset = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_offset = offset + limit
+    return jsonify({"results": results, "next_offset": next_offset})
+
+
 @app.route("/api/turmas", methods=["GET"])
+@cached("turmas", key=lambda: request.args.get("curso_id"), tags=("turmas",), ttl=300)
 def get_turmas():
     """Retorna uma lista de turmas, opcionalmente filtradas por curso."""
     curso_id = request.args.get("curso_id")
@@ -210,6 +500,7 @@ def create_turma():
     turma = Turma(name=data["name"], curso_id=data["curso_id"])
     db.session.add(turma)
     db.session.commit()
+    invalidate_tags("turmas")
     return jsonify({"turma": turma.to_dict()})
 
 
@@ -229,6 +520,8 @@ def update_turma(turma_id):
         turma.is_public = data["is_public"]
 
     db.session.commit()
+    # A turma também aparece nos dados dos participantes dos eventos
+    invalidate_tags("turmas", "events")
     return jsonify({"turma": turma.to_dict()})
 
 
@@ -248,6 +541,8 @@ def add_student_to_turma(turma_id):
     user = User.query.get_or_404(user_id)
     user.turma_id = turma_id
     db.session.commit()
+    invalidate_user(user.id)
+    invalidate_tags("events")
     return jsonify({"message": "Aluno adicionado à turma."})
 
 
@@ -269,56 +564,78 @@ def remove_student_from_turma(turma_id):
 
     user.turma_id = None
     db.session.commit()
+    invalidate_user(user.id)
+    invalidate_tags("events")
     return jsonify({"message": "Aluno removido da turma."})
 
 
+@app.route("/api/turmas/<int:turma_id>/roster", methods=["POST"])
+@login_required
+def update_turma_roster(turma_id):
+    """
+    Adiciona ou remove alunos da turma em lote. Apenas professores.
+
+    JSON: {"action": "add"|"remove", "user_ids": [...]} ou {"emails": [...]};
+    ou multipart com um CSV de e-mails em "file" e "action" no formulário.
+    Só alunos são alterados. Retorna o status de cada linha (added,
+    unchanged, removed, not_in_turma, not_student, not_found, duplicate) e a
+    contagem por status.
+    """
+    if current_user.role != 4:
+        return jsonify({"error": "Apenas professores podem gerenciar alunos."}), 403
+
+    Turma.query.get_or_404(turma_id)
+    try:
+        if "file" in request.files:
+            action = request.form.get("action", roster.ADD)
+            emails = roster.read_emails_csv(request.files["file"].stream)
+            results, changed = roster.apply_roster(turma_id, action, emails=emails)
+        else:
+            data = request.get_json(silent=True) or {}
+            results, changed = roster.apply_roster(
+                turma_id,
+                data.get("action", roster.ADD),
+                user_ids=data.get("user_ids"),
+                emails=data.get("emails"),
+            )
+    except roster.RosterError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+
+    db.session.commit()
+    for user_id in changed:
+        invalidate_user(user_id)
+    if changed:
+        invalidate_tags("events")
+    return jsonify({"results": results, "summary": roster.summarize(results)})
+
+
 @app.route("/api/")
 def index():
     # --- Lógica do Dashboard ---
     if g.user is not None and g.user.is_authenticated:
-        # Coleta dados relevantes para o dashboard
-
-        # Eventos que o usuário está inscrito
-        # (lazy='subquery' no modelo, então a lista já está carregada)
-        inscribed_events = g.user.inscribed_events
-
-        # Submissões do usuário
-        # (lazy='dynamic' no modelo, precisamos executar a query)
-        submissions = g.user.submissions.order_by(Submission.id.desc()).all()
-
-        # Eventos que o usuário organiza
-        # (lazy='dynamic' no modelo, precisamos executar a query)
-        organized_events = g.user.organized_events.order_by(
-            Event.start_date.desc()
-        ).all()
-
-        # Eventos públicos atuais e futuros (para participantes)
-        upcoming_events = (
-            Event.query.filter(
-                Event.status == 2,  # Publicado
-                Event.end_date >= datetime.now(timezone.utc),
-            )
-            .order_by(Event.start_date.asc())
-            .limit(5)
-            .all()
+        # Dados do dashboard: projeções enxutas, já serializadas e em cache
+        # por usuário (o app mobile consulta este endpoint com frequência).
+        # Os próximos eventos são os mesmos para todos e vêm de um fragmento
+        # compartilhado; o corpo é montado sem serializar as listas de novo.
+        data = dashboard_cache.get_or_set(
+            g.user.id, lambda: dashboard_snapshot(g.user.id)
         )
+        data = dict(data, upcoming_events=upcoming_events_json())
 
-        return jsonify(
-            {
-                "authenticated": True,
-                "user": {
-                    "id": g.user.id,
-                    "name": g.user.name,
-                    "email": g.user.email,
-                    "role": g.user.role,
-                },
-                "data": {
-                    "inscribed_events": [e.to_dict() for e in inscribed_events],
-                    "submissions": [s.to_dict() for s in submissions],
-                    "organized_events": [e.to_dict() for e in organized_events],
-                    "upcoming_events": [e.to_dict() for e in upcoming_events],
-                },
-            }
+        return json_response(
+            json_object(
+                {
+                    "authenticated": True,
+                    "user": {
+                        "id": g.user.id,
+                        "name": g.user.name,
+                        "email": g.user.email,
+                        "role": g.user.role,
+                    },
+                    "data": RawJSON(json_object(data)),
+                }
+            )
         )
 
     # Se não estiver logado, mostra a página de índice padrão
@@ -364,7 +681,6 @@ def register():
         user.turma_id = int(data["turma_id"])
 
     db.session.add(user)
-    db.session.commit()
 
     # --- Enviar E-mail de Confirmação de Registro ---
     send_email(
@@ -373,6 +689,7 @@ def register():
         text_body=f"Olá {user.name},\n\nSeu registro na plataforma Eventum foi realizado com sucesso.",
         html_body=f"<p>Olá {user.name},</p><p>Seu registro na plataforma Eventum foi realizado com sucesso.</p>",
     )
+    db.session.commit()
 
     return jsonify(
         {
@@ -395,6 +712,14 @@ def login():
     if user is None or not user.check_password(data["password"]):
         return jsonify({"error": "Email ou senha inválidos."}), 401
 
+    # Hash com parâmetros antigos: regrava com os atuais. Se o pool estiver
+    # ocupado, fica para o próximo login em vez de recusar este
+    try:
+        if user.upgrade_password(data["password"]):
+            db.session.commit()
+    except passwords.HashingBusy:
+        pass
+
     login_user(user)
     return jsonify({"success": True, "message": "Login realizado com sucesso!"})
 
@@ -477,8 +802,9 @@ def create_event():
         db.session.add(event)
         db.session.commit()
         # Inscrever o organizador automaticamente no evento
-        g.user.inscribed_events.append(event)
+        g.user.inscribe(event.id)
         db.session.commit()
+        invalidate_event_caches()
         return (
             jsonify(
                 {
@@ -627,6 +953,8 @@ def edit_event_api(event_id):
             event.turma_id = int(data["turma_id"]) if data["turma_id"] else None
 
         db.session.commit()
+        invalidate_event_caches()
+        certificates.invalidate_event(event_id)
         return (
             jsonify(
                 {
@@ -664,17 +992,31 @@ def my_organized_events():
     # Busca todos os eventos onde o organizer_id é o do usuário logado
     events = (
         Event.query.filter_by(organizer_id=g.user.id)
+        .options(*EVENT_GRAPH)
         .order_by(Event.start_date.desc())
         .all()
     )
 
-    return jsonify({"events": [event.to_dict() for event in events]})
+    return jsonify({"events": serialize(events)})
 
 
 @app.route("/api/events/<int:event_id>")
+@cached(
+    "event_view",
+    # Só organizadores (role 1) podem ver as submissões de um evento: os
+    # demais usuários compartilham a mesma entrada
+    key=lambda event_id: (
+        event_id,
+        g.user.id if g.user.is_authenticated and g.user.role == 1 else None,
+    ),
+    tags=lambda event_id: ("events", f"event:{event_id}"),
+    # Limita quanto tempo is_inscription_open/is_submission_open ficam
+    # desatualizados quando os prazos passam
+    ttl=30,
+)
 def view_event(event_id):
     """Retorna os detalhes de um evento específico."""
-    event = Event.query.get_or_404(event_id)
+    event = Event.query.options(*EVENT_GRAPH).get_or_404(event_id)
     activities = event.activities.order_by(Activity.start_time).all()
     # Lógica para verificar se as inscrições estão abertas
     now = datetime.now(timezone.utc)
@@ -690,19 +1032,21 @@ def view_event(event_id):
         is_submission_open = event.status == 2 and sub_start_date <= now <= sub_end_date
 
     event_dict = event.to_dict()
-    event_dict["organizer"] = event.organizer.to_dict()
-    event_dict["participants"] = [p.to_dict() for p in event.participants]
+    participants = event_participants(event.id)
+    event_dict["participants"] = serialize(participants)
     # Lista para Participantes (apenas perfis públicos)
-    event_dict["public_participants"] = [
-        p.to_dict() for p in event.participants if p.allow_public_profile
-    ]
+    event_dict["public_participants"] = serialize(
+        p for p in participants if p.allow_public_profile
+    )
     if g.user.is_authenticated and event.organizer_id == g.user.id:
-        event_dict["submissions"] = [s.to_dict() for s in event.submissions.all()]
+        event_dict["submissions"] = serialize(
+            event.submissions.options(*SUBMISSION_GRAPH).all()
+        )
 
     return jsonify(
         {
             "event": event_dict,
-            "activities": [activity.to_dict() for activity in activities],
+            "activities": serialize_activities(activities, event.id),
             "is_inscription_open": is_inscription_open,
             "is_submission_open": is_submission_open,
         }
@@ -765,6 +1109,8 @@ def edit_event(event_id):
             event.workload = float(data["workload"])
 
         db.session.commit()
+        invalidate_event_caches()
+        certificates.invalidate_event(event_id)
         return jsonify(
             {
                 "success": True,
@@ -797,6 +1143,8 @@ def delete_event(event_id):
     try:
         db.session.delete(event)
         db.session.commit()
+        invalidate_event_caches()
+        certificates.invalidate_event(event_id)
         return jsonify({"success": True, "message": "Evento removido com sucesso."})
     except Exception as e:
         db.session.rollback()
@@ -813,28 +1161,56 @@ def export_participants(event_id):
     if event.organizer_id != g.user.id:
         abort(403)  # Erro de acesso proibido
 
-    # Busca os participantes
-    participants = event.participants
+    # Colunas opcionais: ?include=curso,turma,attendance
+    include = {
+        key.strip()
+        for key in request.args.get("include", "").split(",")
+        if key.strip() in reports.PARTICIPANT_OPTIONAL_COLUMNS
+    }
 
-    # Prepara o CSV na memória
-    si = io.StringIO()
-    # Usamos 'excel' para garantir compatibilidade com UTF-8
-    cw = csv.writer(si, dialect="excel")
+    # O CSV é gerado em streaming a partir de um cursor no servidor
+    filename = f"inscritos_evento_{event.id}.csv"
+    return Response(
+        stream_with_context(reports.participants_csv(event.id, include)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment;filename={filename}"},
+    )
 
-    # Escreve o cabeçalho
-    cw.writerow(["ID do Participante", "Nome Completo", "Email"])
 
-    # Escreve os dados
-    for participant in participants:
-        cw.writerow([participant.id, participant.name, participant.email])
+@app.route("/api/events/<int:event_id>/reports/attendance")
+@login_required
+def export_attendance_report(event_id):
+    """
+    Matriz de presença (inscrito x atividade) com as horas presentes de cada
+    participante, em CSV, XLSX ou Parquet (?format=csv|xlsx|parquet).
+    """
+    event = Event.query.get_or_404(event_id)
 
-    output = si.getvalue()
+    if event.organizer_id != g.user.id:
+        return jsonify({"error": "Acesso não autorizado."}), 403
 
-    # Retorna o arquivo para download
-    filename = f"inscritos_evento_{event.id}.csv"
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in reports.REPORT_FORMATS:
+        return (
+            jsonify(
+                {
+                    "error": "Formato inválido. Use: "
+                    + ", ".join(reports.REPORT_FORMATS)
+                }
+            ),
+            400,
+        )
+
+    try:
+        content = reports.attendance_report(event.id, fmt)
+    except reports.ReportFormatUnavailable as e:
+        return jsonify({"error": str(e)}), 501
+
+    mimetype, extension = reports.REPORT_FORMATS[fmt]
+    filename = f"presencas_evento_{event.id}.{extension}"
     return Response(
-        output,
-        mimetype="text/csv",
+        stream_with_context(content),
+        mimetype=mimetype,
         headers={"Content-Disposition": f"attachment;filename={filename}"},
     )
 
@@ -900,12 +1276,14 @@ def create_activity(event_id):
         )
         db.session.add(activity)
         db.session.commit()
+        invalidate_event_view(event.id)
         return (
             jsonify(
                 {
                     "success": True,
                     "message": "Atividade adicionada com sucesso!",
-                    "activity": activity.to_dict(),
+                    # Atividade recém-criada ainda não tem check-ins
+                    "activity": activity.to_dict(attendees_count=0),
                 }
             ),
             201,
@@ -918,6 +1296,66 @@ def create_activity(event_id):
         )
 
 
+@app.route("/api/events/<int:event_id>/activities/import", methods=["POST"])
+@login_required
+def import_activities(event_id):
+    """
+    Importa a programação do evento em lote: lista JSON de atividades (ou
+    {"activities": [...]}) ou um arquivo CSV/iCalendar em "file". Todas as
+    atividades são validadas contra o período do evento e gravadas juntas;
+    se alguma tiver erro, nada é gravado e o relatório traz os erros de
+    cada linha.
+    """
+    event = Event.query.get_or_404(event_id)
+    if event.organizer_id != g.user.id:
+        return (
+            jsonify(
+                {
+                    "error": "Acesso não autorizado. Você não é o organizador deste evento."
+                }
+            ),
+            403,
+        )
+
+    try:
+        if "file" in request.files:
+            items = schedule.read_file(request.files["file"].stream)
+        else:
+            data = request.get_json(silent=True)
+            items = data.get("activities") if isinstance(data, dict) else data
+            if not isinstance(items, list):
+                return jsonify({"error": "Lista de atividades obrigatória."}), 400
+        if not items:
+            return jsonify({"error": "Nenhuma atividade informada."}), 400
+        created, report = schedule.import_activities(event, items)
+    except schedule.ScheduleError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if report:
+        db.session.rollback()
+        return (
+            jsonify(
+                {
+                    "error": "Nenhuma atividade foi importada: corrija as linhas com erro.",
+                    "errors": report,
+                }
+            ),
+            400,
+        )
+    db.session.commit()
+    invalidate_event_view(event.id)
+    return (
+        jsonify(
+            {
+                "success": True,
+                "message": f"{created} atividades importadas com sucesso!",
+                "created": created,
+            }
+        ),
+        201,
+    )
+
+
 @app.route("/api/activities/<int:activity_id>", methods=["PUT"])
 @login_required
 def edit_activity(activity_id):
@@ -983,6 +1421,7 @@ def edit_activity(activity_id):
             activity.location = data["location"]
 
         db.session.commit()
+        invalidate_event_view(event.id)
         return jsonify(
             {
                 "success": True,
@@ -1015,9 +1454,11 @@ def delete_activity(activity_id):
             403,
         )
 
+    event_id = activity.event_id
     try:
         db.session.delete(activity)
         db.session.commit()
+        invalidate_event_view(event_id)
         return jsonify({"success": True, "message": "Atividade removida com sucesso."})
     except Exception as e:
         db.session.rollback()
@@ -1038,9 +1479,11 @@ def open_checkin(activity_id):
     # Gera um código numérico curto (6 dígitos) 
     code = "".join(secrets.choice(string.digits) for i in range(6))
     
+    checkin.forget_code(activity.check_in_code)
     activity.check_in_code = code
     activity.check_in_open = True
     db.session.commit()
+    invalidate_event_view(event.id)
     
     return jsonify({
         "success": True, 
@@ -1060,9 +1503,11 @@ def close_checkin(activity_id):
     if event.organizer_id != g.user.id:
         return jsonify({"error": "Acesso não autorizado."}), 403
     
+    checkin.forget_code(activity.check_in_code)
     activity.check_in_code = None
     activity.check_in_open = False
     db.session.commit()
+    invalidate_event_view(event.id)
     
     return jsonify({
         "success": True, 
@@ -1078,62 +1523,47 @@ def submit_checkin():
     data = request.get_json()
     if not data or "code" not in data:
         return jsonify({"error": "Código (code) obrigatório."}), 400
-        
+
     code = data["code"].strip()
     user = g.user
 
-    # Encontra a atividade com este código aberto
-    activity = Activity.query.filter_by(
-        check_in_code=code, 
-        check_in_open=True
-    ).first()
-
-    if not activity:
+    # Encontra a atividade com este código aberto (cache por código)
+    info = checkin.lookup_open_code(code)
+    if not info:
         return jsonify({"error": "Código de check-in inválido ou expirado."}), 404
 
-    event = activity.event
-
-    # 1. Verifica se o usuário está inscrito no evento
-    if event not in user.inscribed_events:
-        return jsonify({"error": "Você não está inscrito neste evento."}), 403
-
-    # 2. Verifica se o usuário já fez check-in nesta atividade
-    if activity in user.attended_activities:
-        return jsonify({"error": "Você já fez check-in nesta atividade."}), 409
-
-    # 3. Registra a presença [cite: 52]
+    # Registra a presença [cite: 52] com um único INSERT, que também exige
+    # a inscrição no evento e ignora check-ins repetidos
     try:
-        user.attended_activities.append(activity)
-        db.session.commit()
-
-        # 4. Lógica de Notificação Automática [cite: 53, 55]
-        # Verifica se o evento está vinculado a uma turma específica
-        if event.turma_id:
-            # Verifica se o aluno pertence a essa turma
-            if user.turma_id == event.turma_id:
-                organizer = event.organizer
-                turma = event.turma
-                
-                # Envia o e-mail para o professor/organizador
-                send_email(
-                    subject=f"Confirmação de Presença (Horas): {user.name}",
-                    recipients=[organizer.email],
-                    text_body=f"Olá {organizer.name},\n\nO aluno {user.name} (da turma {turma.name}) "
-                              f"fez check-in na atividade '{activity.title}' "
-                              f"do evento '{event.title}'.\n\n"
-                              f"Este aluno está elegível para {event.workload or 0} horas complementares.",
-                    html_body=f"<p>Olá {organizer.name},</p>"
-                              f"<p>O aluno <strong>{user.name}</strong> (da turma <strong>{turma.name}</strong>) "
-                              f"fez check-in na atividade '<strong>{activity.title}</strong>' "
-                              f"do evento '<strong>{event.title}</strong>'.</p>"
-                              f"<p>Este aluno está elegível para <strong>{event.workload or 0} horas</strong> complementares.</p>"
-                )
-
-        return jsonify({"success": True, "message": "Check-in realizado com sucesso!"})
-
+        if not checkin.record_checkin(user.id, info["activity_id"], code):
+            error, status = checkin.diagnose_failure(user, info, code)
+            return jsonify({"error": error}), status
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Erro ao registrar presença.", "details": str(e)}), 500
+    # Contagem de presenças exibida nos detalhes do evento
+    invalidate_event_view(info["event_id"])
+
+    # Lógica de Notificação Automática [cite: 53, 55]
+    # Se o evento está vinculado a uma turma e o aluno pertence a ela,
+    # avisa o professor/organizador
+    if info["turma_id"] and user.turma_id == info["turma_id"]:
+        send_email(
+            subject=f"Confirmação de Presença (Horas): {user.name}",
+            recipients=[info["organizer_email"]],
+            text_body=f"Olá {info['organizer_name']},\n\nO aluno {user.name} (da turma {info['turma_name']}) "
+                      f"fez check-in na atividade '{info['activity_title']}' "
+                      f"do evento '{info['event_title']}'.\n\n"
+                      f"Este aluno está elegível para {info['workload'] or 0} horas complementares.",
+            html_body=f"<p>Olá {info['organizer_name']},</p>"
+                      f"<p>O aluno <strong>{user.name}</strong> (da turma <strong>{info['turma_name']}</strong>) "
+                      f"fez check-in na atividade '<strong>{info['activity_title']}</strong>' "
+                      f"do evento '<strong>{info['event_title']}</strong>'.</p>"
+                      f"<p>Este aluno está elegível para <strong>{info['workload'] or 0} horas</strong> complementares.</p>"
+        )
+        db.session.commit()
+
+    return jsonify({"success": True, "message": "Check-in realizado com sucesso!"})
 
 
 # --- Inscrições em Eventos (Apenas para Participantes) ---
@@ -1159,19 +1589,21 @@ def inscribe(event_id):
         )
 
     # Regra de Negócio: O sistema não deve permitir que o mesmo usuário se inscreva mais de uma vez
-    if event in g.user.inscribed_events:
+    if g.user.is_inscribed(event.id):
         return jsonify({"error": "Você já está inscrito neste evento."}), 409
 
     try:
-        g.user.inscribed_events.append(event)
-        db.session.commit()
-        # Envia e-mail de confirmação de inscrição
+        g.user.inscribe(event.id)
+        # Envia e-mail de confirmação de inscrição (gravado no mesmo commit)
         send_email(
             subject=f"Inscrição Confirmada: {event.title}",
             recipients=[g.user.email],
             text_body=f"Olá {g.user.name},\n\nSua inscrição no evento '{event.title}' foi realizada com sucesso.",
             html_body=f"<p>Olá {g.user.name},</p><p>Sua inscrição no evento <strong>{event.title}</strong> foi realizada com sucesso.</p>",
         )
+        db.session.commit()
+        invalidate_dashboard(g.user.id)
+        invalidate_event_view(event_id)
         return jsonify({"success": True, "message": "Inscrição realizada com sucesso!"})
     except Exception as e:
         db.session.rollback()
@@ -1185,8 +1617,8 @@ def inscribe(event_id):
 @login_required
 def my_inscriptions():
     """Retorna a lista de eventos nos quais o usuário está inscrito."""
-    events = g.user.inscribed_events
-    return jsonify({"events": [event.to_dict() for event in events]})
+    events = user_inscribed_events(g.user.id)
+    return jsonify({"events": serialize(events)})
 
 
 @app.route("/api/me/settings", methods=["PUT"])
@@ -1215,6 +1647,11 @@ def update_settings():
             g.user.set_password(data["password"])
 
         db.session.commit()
+        invalidate_user(g.user.id)
+        if "name" in data or "allow_public_profile" in data:
+            # O nome aparece como organizador nos eventos e dashboards de
+            # outros usuários, e o perfil público na lista de participantes
+            invalidate_event_caches()
         return jsonify(
             {
                 "success": True,
@@ -1222,6 +1659,9 @@ def update_settings():
                 "user": g.user.to_dict(),
             }
         )
+    except passwords.HashingBusy:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return (
@@ -1236,12 +1676,14 @@ def unsubscribe(event_id):
     """Processa o cancelamento da inscrição de um usuário em um evento."""
     event = Event.query.get_or_404(event_id)
 
-    if event not in g.user.inscribed_events:
+    if not g.user.is_inscribed(event.id):
         return jsonify({"error": "Você não está inscrito neste evento."}), 400
 
     try:
-        g.user.inscribed_events.remove(event)
+        g.user.unsubscribe(event.id)
         db.session.commit()
+        invalidate_dashboard(g.user.id)
+        invalidate_event_view(event_id)
         return jsonify({"success": True, "message": "Inscrição cancelada com sucesso!"})
     except Exception as e:
         db.session.rollback()
@@ -1257,10 +1699,12 @@ def unsubscribe(event_id):
 def my_submissions():
     """Retorna a lista de trabalhos submetidos pelo usuário."""
     # O relacionamento 'submissions' em User nos dá a lista
-    submissions = g.user.submissions.order_by(Submission.id.desc()).all()
-    return jsonify(
-        {"submissions": [submission.to_dict() for submission in submissions]}
+    submissions = (
+        g.user.submissions.options(*SUBMISSION_GRAPH)
+        .order_by(Submission.id.desc())
+        .all()
     )
+    return jsonify({"submissions": serialize(submissions)})
 
 
 @app.route("/event/<int:event_id>/submit", methods=["GET", "POST"])
@@ -1292,67 +1736,117 @@ def new_submission(event_id):
     if form.validate_on_submit():
         file = form.submission_file.data
 
-        # Verificacão de extensão e segurança
-        # Valida MIME type
-        mime = magic.Magic(mime=True)
-        file_mime = mime.from_buffer(file.read())
-        file.seek(0)
-        allowed_mimes = [
-            "application/pdf",
-            "application/msword",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            "application/rtf",
-            "text/rtf",
-            "application/vnd.oasis.opendocument.text",
-            "text/plain",
-        ]
-        if file_mime not in allowed_mimes:
+        # Verificacão de extensão e segurança: o MIME type é detectado pelo
+        # início do arquivo enquanto ele é gravado em disco
+        try:
+            stored = storage.save_upload(file)
+        except storage.FileTypeNotAllowed:
             flash(
                 "Tipo de arquivo não permitido. Apenas documentos PDF, DOC, DOCX, ODT e RTF são aceitos.",
                 "danger",
             )
             return redirect(url_for("new_submission", event_id=event.id))
 
-        filename = secure_filename(file.filename)
-        upload_folder = app.config["UPLOADED_FILES_DEST"]
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
-
         submission = Submission(
             title=form.title.data,
-            file_path=filename,
+            file_path=stored.path,
+            original_filename=stored.original_filename,
+            content_hash=stored.sha256,
+            file_size=stored.size,
+            mime_type=stored.mime_type,
             author_id=g.user.id,  # Associa a submissão ao usuário logado
             event_id=event.id,  # Associa ao evento atual
         )
         db.session.add(submission)
         db.session.commit()
+        invalidate_dashboard(g.user.id)
+        invalidate_event_view(event.id)
         flash("Trabalho submetido com sucesso!", "success")
         return redirect(url_for("my_submissions"))
 
     return jsonify({"page": "unknown"})
 
 
+@app.route("/api/events/<int:event_id>/submissions.zip")
+@login_required
+def download_submissions_zip(event_id):
+    """
+    Baixa um ZIP com os arquivos de todas as submissões do evento,
+    opcionalmente filtradas por status (?status=3 ou ?status=1,2).
+    """
+    event = Event.query.get_or_404(event_id)
+
+    if event.organizer_id != g.user.id:
+        return jsonify({"error": "Acesso não autorizado."}), 403
+
+    stmt = (
+        select(
+            Submission.id,
+            Submission.file_path,
+            func.coalesce(Submission.original_filename, Submission.file_path),
+            User.name,
+        )
+        .join(User, User.id == Submission.author_id)
+        .where(Submission.event_id == event.id)
+        .order_by(Submission.id)
+    )
+    if request.args.get("status"):
+        try:
+            statuses = [int(value) for value in request.args["status"].split(",")]
+        except ValueError:
+            return jsonify({"error": "Status inválido."}), 400
+        stmt = stmt.where(Submission.status.in_(statuses))
+
+    submissions = [
+        # Submissões antigas guardam só o nome do arquivo em file_path
+        (sub_id, file_path, file_name.rsplit("/", 1)[-1], author_name)
+        for sub_id, file_path, file_name, author_name in db.session.execute(stmt)
+    ]
+    return Response(
+        storage.stream_submissions_zip(submissions),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=submissoes_evento_{event.id}.zip"
+        },
+    )
+
+
+def _submission_for_download(submission_id):
+    """
+    Carrega a submissão e o organizador do evento em uma única consulta
+    (para a verificação de permissão do download), ou aborta com 404.
+    """
+    row = db.session.execute(
+        select(Submission, Event.organizer_id)
+        .join(Event, Event.id == Submission.event_id)
+        .where(Submission.id == submission_id)
+    ).first()
+    if row is None:
+        abort(404)
+    return row
+
+
+def _send_submission_file(sub):
+    return storage.send_stored_file(
+        sub.file_path,
+        download_name=sub.file_name,
+        mimetype=sub.mime_type,
+        content_hash=sub.content_hash,
+    )
+
+
 @app.route("/submission/download/<int:submission_id>")
 @login_required
 def download_submission(submission_id):
     """Permite o download do arquivo de submissão (Autor ou Organizador)."""
-    sub = Submission.query.get_or_404(submission_id)
+    sub, organizer_id = _submission_for_download(submission_id)
 
     # Segurança: Apenas o autor ou o organizador do evento podem baixar
-    if sub.author_id != g.user.id and sub.event.organizer_id != g.user.id:
+    if sub.author_id != g.user.id and organizer_id != g.user.id:
         abort(403)
 
-    try:
-        # Retorna o arquivo da pasta de uploads
-        return send_from_directory(
-            app.config["UPLOADED_FILES_DEST"],
-            sub.file_path,
-            as_attachment=True,
-        )
-    except FileNotFoundError:
-        abort(404)
+    # Retorna o arquivo da pasta de uploads (404 se não existir)
+    return _send_submission_file(sub)
 
 
 @app.route("/submission/evaluate/<int:submission_id>", methods=["POST"])
@@ -1371,7 +1865,6 @@ def evaluate_submission(submission_id):
         # Status: 3=Aprovado, 4=Rejeitado
         if new_status in [3, 4]:
             sub.status = new_status
-            db.session.commit()
 
             # Envia e-mail ao autor notificando sobre a decisão
             status_str = "Aprovado" if sub.status == 3 else "Rejeitado"
@@ -1381,6 +1874,9 @@ def evaluate_submission(submission_id):
                 text_body=f"Olá {sub.author.name},\n\nO status do seu trabalho '{sub.title}' (submetido para o evento '{sub.event.title}') foi atualizado para: {status_str}.",
                 html_body=f"<p>Olá {sub.author.name},</p><p>O status do seu trabalho '<strong>{sub.title}</strong>' (submetido para o evento '<strong>{sub.event.title}</strong>') foi atualizado para: <strong>{status_str}</strong>.</p>",
             )
+            db.session.commit()
+            invalidate_dashboard(sub.author_id)
+            invalidate_event_view(sub.event_id)
 
             flash("O status da submissão foi atualizado.", "success")
         else:
@@ -1406,7 +1902,6 @@ def api_evaluate_submission(submission_id):
     new_status = int(data["new_status"])
     if new_status in [3, 4]:
         sub.status = new_status
-        db.session.commit()
 
         # Envia e-mail ao autor notificando sobre a decisão
         status_str = "Aprovado" if sub.status == 3 else "Rejeitado"
@@ -1416,6 +1911,9 @@ def api_evaluate_submission(submission_id):
             text_body=f"Olá {sub.author.name},\n\nO status do seu trabalho '{sub.title}' (submetido para o evento '{sub.event.title}') foi atualizado para: {status_str}.",
             html_body=f"<p>Olá {sub.author.name},</p><p>O status do seu trabalho '<strong>{sub.title}</strong>' (submetido para o evento '<strong>{sub.event.title}</strong>') foi atualizado para: <strong>{status_str}</strong>.</p>",
         )
+        db.session.commit()
+        invalidate_dashboard(sub.author_id)
+        invalidate_event_view(sub.event_id)
 
         return jsonify({"success": True, "message": "Status atualizado"})
     else:
@@ -1426,20 +1924,16 @@ def api_evaluate_submission(submission_id):
 @login_required
 def api_download_submission(submission_id):
     """API para download do arquivo de submissão."""
-    sub = Submission.query.get_or_404(submission_id)
+    sub, organizer_id = _submission_for_download(submission_id)
 
     # Segurança: Apenas o autor ou o organizador do evento podem baixar
-    if sub.author_id != g.user.id and sub.event.organizer_id != g.user.id:
+    if sub.author_id != g.user.id and organizer_id != g.user.id:
         return jsonify({"error": "Acesso não autorizado"}), 403
 
     try:
         # Retorna o arquivo da pasta de uploads
-        return send_from_directory(
-            app.config["UPLOADED_FILES_DEST"],
-            sub.file_path,
-            as_attachment=True,
-        )
-    except FileNotFoundError:
+        return _send_submission_file(sub)
+    except NotFound:
         return jsonify({"error": "Arquivo não encontrado"}), 404
 
 
@@ -1534,37 +2028,26 @@ def submit_work(event_id):
             400,
         )
 
-    # Valida MIME type
-    mime = magic.Magic(mime=True)
-    file_mime = mime.from_buffer(file.read())
-    file.seek(0)
-    allowed_mimes = [
-        "application/pdf",
-        "application/msword",
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        "application/rtf",
-        "text/rtf",
-        "application/vnd.oasis.opendocument.text",
-        "text/plain",
-    ]
-    if file_mime not in allowed_mimes:
+    # Valida o MIME type e grava o arquivo em pedaços (app/storage.py)
+    try:
+        stored = storage.save_upload(file)
+    except storage.FileTypeNotAllowed:
         return jsonify({"error": "Tipo de arquivo não permitido."}), 400
 
-    filename = secure_filename(file.filename)
-    upload_folder = app.config["UPLOADED_FILES_DEST"]
-    if not os.path.exists(upload_folder):
-        os.makedirs(upload_folder)
-    file_path = os.path.join(upload_folder, filename)
-    file.save(file_path)
-
     submission = Submission(
         title=title,
-        file_path=filename,
+        file_path=stored.path,
+        original_filename=stored.original_filename,
+        content_hash=stored.sha256,
+        file_size=stored.size,
+        mime_type=stored.mime_type,
         author_id=g.user.id,
         event_id=event.id,
     )
     db.session.add(submission)
     db.session.commit()
+    invalidate_dashboard(g.user.id)
+    invalidate_event_view(event.id)
     return (
         jsonify(
             {
@@ -1586,7 +2069,7 @@ def generate_certificate(event_id):
     now = datetime.now(timezone.utc)
 
     # 1. Verifica se o usuário está inscrito
-    if event not in user.inscribed_events:
+    if not user.is_inscribed(event.id):
         return (
             jsonify({"error": "Você não está inscrito neste evento."}),
             403,
@@ -1600,54 +2083,79 @@ def generate_certificate(event_id):
             400,
         )
 
-    # 3. Gera o HTML do certificado
-    # (Em um projeto maior, usaríamos um template Jinja2,
-    # mas um HTML string é suficiente)
-    html_template = f"""
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            body {{ font-family: sans-serif; text-align: center; padding: 40px; }}
-            .container {{ border: 10px solid #003366; padding: 50px; height: 90%; box-sizing: border-box; }}
-            h1 {{ color: #003366; font-size: 48px; margin-bottom: 20px; }}
-            h2 {{ font-size: 32px; margin-bottom: 50px; }}
-            p {{ font-size: 18px; line-height: 1.6; margin: 20px 0; }}
-            .signature {{ margin-top: 80px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>CERTIFICADO</h1>
-            <p>Certificamos que</p>
-            <h2>{user.name}</h2>
-            <p>
-                participou do evento
-                <strong>"{event.title}"</strong>,
-                organizado por {event.organizer.name},
-                realizado entre {event.start_date.strftime('%d/%m/%Y')} e {event.end_date.strftime('%d/%m/%Y')},
-                totalizando uma carga horária de <strong>{event.workload or 0} horas</strong>.
-            </p>
-            <div class="signature">
-                <p>___________________________________</p>
-                <p>{event.organizer.name}</p>
-                <p>Organizador(a)</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    # 3. Busca o PDF no cache em disco (renderiza só se ainda não existir)
+    path = certificates.certificate_file(event, user)
+
+    # 4. Retorna o PDF como download
+    return send_file(
+        path,
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=f"certificado_{event.id}.pdf",
+    )
+
+
+@app.route("/api/events/<int:event_id>/certificates/pregenerate", methods=["POST"])
+@login_required
+def pregenerate_certificates(event_id):
+    """Pré-gera em background os certificados de todos os inscritos no evento."""
+    event = Event.query.get_or_404(event_id)
+
+    if event.organizer_id != g.user.id:
+        return jsonify({"error": "Acesso não autorizado."}), 403
+
+    job = certificates.pregenerate_event(event.id)
+    return jsonify({"success": True, "job": job}), 202
 
-    # 4. Converte HTML para PDF em memória
-    pdf = HTML(string=html_template).write_pdf()
 
-    # 5. Retorna o PDF como download
-    response = make_response(pdf)
-    response.headers["Content-Type"] = "application/pdf"
-    response.headers["Content-Disposition"] = (
-        f"attachment; filename=certificado_{event.id}.pdf"
+@app.route("/api/events/<int:event_id>/certificates.zip")
+@login_required
+def download_certificates_zip(event_id):
+    """Baixa um ZIP com os certificados de todos os inscritos no evento."""
+    event = Event.query.get_or_404(event_id)
+
+    if event.organizer_id != g.user.id:
+        return jsonify({"error": "Acesso não autorizado."}), 403
+
+    event_end_aware = event.end_date.replace(tzinfo=timezone.utc)
+    if event_end_aware > datetime.now(timezone.utc):
+        return jsonify({"error": "O evento ainda não terminou."}), 400
+
+    # A lista é montada antes de começar a resposta; o ZIP é gerado em
+    # streaming enquanto o pool de processos renderiza os PDFs que faltam
+    items = certificates.event_certificates(event)
+    return Response(
+        certificates.stream_event_zip(items),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=certificados_evento_{event.id}.zip"
+        },
     )
-    return response
+
+
+@app.route("/api/events/<int:event_id>/certificates/status")
+@login_required
+def pregenerate_certificates_status(event_id):
+    """Andamento da pré-geração de certificados do evento."""
+    event = Event.query.get_or_404(event_id)
+
+    if event.organizer_id != g.user.id:
+        return jsonify({"error": "Acesso não autorizado."}), 403
+
+    job = certificates.job_status(event.id)
+    if job is None:
+        # Estado do job expirado ou em outro worker (CACHE_BACKEND=memory):
+        # informa ao menos quantos certificados já estão em disco
+        cached = certificates.cached_count(event.id)
+        if not cached:
+            return jsonify({"error": "Nenhuma pré-geração iniciada para este evento."}), 404
+        total = db.session.scalar(
+            select(func.count())
+            .select_from(inscriptions)
+            .where(inscriptions.c.event_id == event.id)
+        )
+        job = {"status": "unknown", "total": total, "cached": cached}
+    return jsonify({"job": job})
 
 
 @app.route("/api/forgot-password", methods=["POST"])
@@ -1671,7 +2179,6 @@ def forgot_password():
 
     token = secrets.token_urlsafe(32)
     user.reset_token = token
-    db.session.commit()
 
     # Enviar email
     reset_url = f"http://localhost:3000/reset-password?token={token}"
@@ -1681,6 +2188,7 @@ def forgot_password():
         text_body=f"Olá {user.name},\n\nPara redefinir sua senha, clique no link: {reset_url}",
         html_body=f"<p>Olá {user.name},</p><p>Para redefinir sua senha, <a href='{reset_url}'>clique aqui</a>.</p>",
     )
+    db.session.commit()
 
     return jsonify(
         {
@@ -1703,16 +2211,164 @@ def reset_password():
     user.set_password(data["password"])
     user.reset_token = None
     db.session.commit()
+    invalidate_user(user.id)
 
     return jsonify({"success": True, "message": "Senha redefinida com sucesso!"})
 
 
+@app.route("/api/metrics/email")
+@login_required
+def email_metrics():
+    """Métricas da fila de e-mails. Apenas para organizadores."""
+    if g.user.role != 1:
+        return jsonify({"error": "Acesso negado."}), 403
+    return jsonify(mailer.outbox_metrics())
+
+
+@app.route("/api/metrics/passwords")
+@login_required
+def password_metrics():
+    """Métricas do pool de hash de senhas. Apenas para organizadores."""
+    if g.user.role != 1:
+        return jsonify({"error": "Acesso negado."}), 403
+    return jsonify(passwords.pool_metrics())
+
+
+@app.route("/api/metrics/cache")
+@login_required
+def cache_metrics():
+    """Métricas do cache (acertos, faltas, remoções). Apenas para organizadores."""
+    if g.user.role != 1:
+        return jsonify({"error": "Acesso negado."}), 403
+    return jsonify(cache_stats())
+
+
+USERS_PAGE_SIZE = 50
+USERS_MAX_PAGE_SIZE = 200
+
+
+def _encode_user_cursor(name, user_id):
+    """Codifica a posição (name, id) de um usuário em um cursor opaco."""
+    raw = f"{name}|{user_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_user_cursor(cursor):
+    """Decodifica um cursor de /api/users. Levanta ValueError se inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        name, user_id = raw.rsplit("|", 1)
+        return name, int(user_id)
+    except (UnicodeError, ValueError) as e:
+        raise ValueError("Cursor inválido.") from e
+
+
 @app.route("/api/users", methods=["GET"])
 @login_required
 def get_users():
-    """Retorna lista de usuários. Apenas para professores."""
+    """
+    Diretório de usuários, paginado por cursor (keyset) em (name, id).
+    Apenas para professores.
+
+    Parâmetros opcionais: q (prefixo do nome ou do e-mail, sem diferenciar
+    maiúsculas), role, curso_id, turma_id, cursor e limit. Cada usuário vem
+    só com os campos usados nas telas de gestão e os nomes do curso, da
+    turma e da faculdade, resolvidos na mesma consulta.
+    """
     if current_user.role != 4:
         return jsonify({"error": "Acesso negado."}), 403
 
-    users = User.query.all()
-    return jsonify({"users": [u.to_dict() for u in users]})
+    limit = max(
+        1,
+        min(
+            request.args.get("limit", USERS_PAGE_SIZE, type=int) or USERS_PAGE_SIZE,
+            USERS_MAX_PAGE_SIZE,
+        ),
+    )
+    try:
+        cursor = request.args.get("cursor")
+        position = _decode_user_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": "Parâmetros inválidos.", "details": str(e)}), 400
+
+    stmt = (
+        select(
+            User.id,
+            User.name,
+            User.email,
+            User.role,
+            User.curso_id,
+            User.turma_id,
+            Curso.name.label("curso"),
+            Turma.name.label("turma"),
+            Faculdade.name.label("faculdade"),
+        )
+        .outerjoin(Curso, User.curso_id == Curso.id)
+        .outerjoin(Faculdade, Curso.faculdade_id == Faculdade.id)
+        .outerjoin(Turma, User.turma_id == Turma.id)
+    )
+    for column in ("role", "curso_id", "turma_id"):
+        value = request.args.get(column, type=int)
+        if value is not None:
+            stmt = stmt.where(getattr(User, column) == value)
+    q = request.args.get("q", "").strip().lower()
+    if q:
+        # Prefixo de lower(name)/lower(email): índices text_pattern_ops no
+        # Postgres (migração c9e1f3a5b7d2)
+        stmt = stmt.where(
+            or_(
+                func.lower(User.name).startswith(q, autoescape=True),
+                func.lower(User.email).startswith(q, autoescape=True),
+            )
+        )
+    if position:
+        stmt = stmt.where(tuple_(User.name, User.id) > position)
+
+    # Busca um item a mais para saber se existe uma próxima página
+    rows = db.session.execute(
+        stmt.order_by(User.name, User.id).limit(limit + 1)
+    ).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_user_cursor(rows[-1].name, rows[-1].id)
+
+    return jsonify(
+        {"users": [row._asdict() for row in rows], "next_cursor": next_cursor}
+    )
+
+
+@app.route("/api/users/import", methods=["POST"])
+@login_required
+def import_students():
+    """
+    Cria contas de alunos em lote a partir de um CSV (multipart, campo
+    "file") com as colunas name e email e, opcionalmente, curso_id,
+    turma_id e password. curso_id e turma_id do formulário valem para as
+    linhas sem esses valores. Apenas organizadores e professores.
+
+    Sem senha, o aluno recebe no e-mail de boas-vindas um link para
+    escolher a senha. Retorna o status de cada linha (created, exists,
+    duplicate, invalid) e a contagem por status.
+    """
+    if g.user.role not in (1, 4):
+        return jsonify({"error": "Acesso negado."}), 403
+    if "file" not in request.files:
+        return jsonify({"error": "Arquivo é obrigatório."}), 400
+
+    try:
+        rows = provisioning.read_students_csv(request.files["file"].stream)
+        if not rows:
+            return jsonify({"error": "Nenhum aluno no arquivo."}), 400
+        results = provisioning.provision_students(
+            rows,
+            default_curso_id=request.form.get("curso_id", type=int),
+            default_turma_id=request.form.get("turma_id", type=int),
+        )
+    except provisioning.TooManyPasswords as e:
+        return jsonify({"error": str(e)}), 413
+    except provisioning.ProvisioningError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"results": results, "summary": provisioning.summarize(results)})
@@ -46,6 +46,22 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# Índices criados só por SQL nas migrações, que dependem de extensões do
+# Postgres e por isso não estão nos modelos (b7e2f4a6c8d0: busca por
+# trigramas). O autogenerate não deve propor removê-los.
+MIGRATION_ONLY_INDEXES = {
+    'ix_faculdade_name_trgm',
+    'ix_curso_name_trgm',
+    'ix_turma_name_trgm',
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'index' and reflected and name in MIGRATION_ONLY_INDEXES:
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -66,7 +82,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -94,6 +111,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     db_url = os.environ.get("SQLALCHEMY_DATABASE_URI")
 
@@ -0,0 +1,32 @@
+"""Add composite indexes for paginated event listing
+
+Revision ID: a7c3e9f1b2d4
+Revises: 5a0896615918
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f1b2d4'
+down_revision = '5a0896615918'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index('ix_event_status_start_date_id', ['status', 'start_date', 'id'], unique=False)
+        batch_op.create_index('ix_event_faculdade_status_start_date', ['faculdade_id', 'status', 'start_date'], unique=False)
+        batch_op.create_index('ix_event_curso_status_start_date', ['curso_id', 'status', 'start_date'], unique=False)
+        batch_op.create_index('ix_event_turma_status_start_date', ['turma_id', 'status', 'start_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_turma_status_start_date')
+        batch_op.drop_index('ix_event_curso_status_start_date')
+        batch_op.drop_index('ix_event_faculdade_status_start_date')
+        batch_op.drop_index('ix_event_status_start_date_id')
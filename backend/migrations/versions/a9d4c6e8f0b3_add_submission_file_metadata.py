@@ -0,0 +1,32 @@
+"""Add file metadata columns to submission
+
+Revision ID: a9d4c6e8f0b3
+Revises: f3a5c7e9b1d2
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d4c6e8f0b3'
+down_revision = 'f3a5c7e9b1d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('submission', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('original_filename', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('file_size', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('mime_type', sa.String(length=100), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('submission', schema=None) as batch_op:
+        batch_op.drop_column('mime_type')
+        batch_op.drop_column('file_size')
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('original_filename')
@@ -0,0 +1,51 @@
+"""Add trigram indexes for the academic name search
+
+Revision ID: b7e2f4a6c8d0
+Revises: a9d4c6e8f0b3
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2f4a6c8d0'
+down_revision = 'a9d4c6e8f0b3'
+branch_labels = None
+depends_on = None
+
+TABLES = ('faculdade', 'curso', 'turma')
+
+
+def upgrade():
+    # Só no Postgres; no SQLite a busca usa o índice de n-gramas em memória
+    # (ver app/search.py)
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    # unaccent() não é IMMUTABLE (depende do dicionário configurado), então
+    # não pode ser usada em um índice de expressão diretamente
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text
+        AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        """
+    )
+    # Fora dos modelos: migrations/env.py os exclui do autogenerate
+    for table in TABLES:
+        op.execute(
+            f'CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} '
+            f'USING gin (immutable_unaccent(lower(name)) gin_trgm_ops)'
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table in TABLES:
+        op.execute(f'DROP INDEX IF EXISTS ix_{table}_name_trgm')
+    op.execute('DROP FUNCTION IF EXISTS immutable_unaccent(text)')
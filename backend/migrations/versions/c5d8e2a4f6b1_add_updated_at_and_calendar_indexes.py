@@ -0,0 +1,37 @@
+"""Add updated_at to event/activity and calendar indexes
+
+Revision ID: c5d8e2a4f6b1
+Revises: a7c3e9f1b2d4
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8e2a4f6b1'
+down_revision = 'a7c3e9f1b2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # server_default preenche as linhas existentes
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+        batch_op.create_index('ix_activity_start_time', ['start_time'], unique=False)
+        batch_op.create_index('ix_activity_event_id_start_time', ['event_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_event_id_start_time')
+        batch_op.drop_index('ix_activity_start_time')
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,42 @@
+"""Add indexes for the paginated user directory
+
+Revision ID: c9e1f3a5b7d2
+Revises: b7e2f4a6c8d0
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e1f3a5b7d2'
+down_revision = 'b7e2f4a6c8d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_name_id', ['name', 'id'], unique=False)
+        batch_op.create_index('ix_user_curso_id_name_id', ['curso_id', 'name', 'id'], unique=False)
+        batch_op.create_index('ix_user_turma_id_name_id', ['turma_id', 'name', 'id'], unique=False)
+
+    # Busca por prefixo (lower(name) LIKE 'ab%'): no Postgres, com collation
+    # diferente de "C", o LIKE só usa o índice com text_pattern_ops
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE INDEX ix_user_lower_name ON "user" (lower(name) text_pattern_ops)')
+        op.execute('CREATE INDEX ix_user_lower_email ON "user" (lower(email) text_pattern_ops)')
+    else:
+        op.create_index('ix_user_lower_name', 'user', [sa.text('lower(name)')], unique=False)
+        op.create_index('ix_user_lower_email', 'user', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_lower_email', table_name='user')
+    op.drop_index('ix_user_lower_name', table_name='user')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_turma_id_name_id')
+        batch_op.drop_index('ix_user_curso_id_name_id')
+        batch_op.drop_index('ix_user_name_id')
@@ -0,0 +1,33 @@
+"""Add indexes on inscriptions.event_id and activity_attendance.activity_id
+
+Revision ID: d2b6f8a1c3e5
+Revises: c5d8e2a4f6b1
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b6f8a1c3e5'
+down_revision = 'c5d8e2a4f6b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # As PKs (user_id, ...) já atendem as verificações por usuário (EXISTS)
+    with op.batch_alter_table('inscriptions', schema=None) as batch_op:
+        batch_op.create_index('ix_inscriptions_event_id', ['event_id'], unique=False)
+
+    with op.batch_alter_table('activity_attendance', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_attendance_activity_id', ['activity_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity_attendance', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_attendance_activity_id')
+
+    with op.batch_alter_table('inscriptions', schema=None) as batch_op:
+        batch_op.drop_index('ix_inscriptions_event_id')
@@ -0,0 +1,26 @@
+"""Add index on activity.check_in_code
+
+Revision ID: e8f1a3b5c7d9
+Revises: d2b6f8a1c3e5
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8f1a3b5c7d9'
+down_revision = 'd2b6f8a1c3e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_check_in_code', ['check_in_code'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_check_in_code')
@@ -7,9 +7,17 @@ try:
         from app.populate_cursos import populate_faculdades, populate_cursos
         populate_faculdades()
         populate_cursos()
+        # Carrega o registro de faculdades antes do primeiro request
+        from app import faculdades
+        faculdades.registry()
 except Exception as e:
     print(f"Erro ao popular banco: {e}")
 
 if __name__ == "__main__":
+	# Retoma o envio dos e-mails pendentes da fila. Com o reloader do modo
+	# debug, só no processo que atende os requests
+	if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+		from app import mailer
+		mailer.start_workers()
 	port = int(os.environ.get("PORT", 5000))
 	app.run(host='0.0.0.0', port=port)